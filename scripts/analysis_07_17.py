@@ -11,7 +11,8 @@ if __name__ == '__main__':
      # Read data from a csv file.
      headers, data = read_csv_file('/Users/minerva/Lab/SolarFlow/data/Sq_12_07_17_freq_sweep.csv',
                                    delimiter=', ',
-                                   start_line=3)
+                                   start_line=3,
+                                   cache=True)
      
      # Extract impedance data by frequency.
      unique_frequencies = get_unique_frequencies(data)
@@ -10,7 +10,8 @@ if __name__ == '__main__':
      # Read data from a csv file.
      headers, data = read_csv_file('/Users/minerva/Lab/SolarFlow/data/Sq_14_08_18_freq_sweep_2.csv',
                                    delimiter=', ',
-                                   start_line=3)
+                                   start_line=3,
+                                   cache=True)
      
      # Extract impedance data by frequency.
      unique_frequencies = get_unique_frequencies(data)
@@ -11,7 +11,8 @@ def analysis(device_keys):
           # Read data from a csv file.
           headers, data = read_csv_file(f'/Users/minerva/Lab/SolarFlow/data/{device_key}_08_21_freq_sweep.csv',
                                         delimiter=',',
-                                        start_line=3)
+                                        start_line=3,
+                                        cache=True)
           
           # Extract impedance data by frequency.
           unique_frequencies = get_unique_frequencies(data)
@@ -10,7 +10,8 @@ from solarflow.analysis import fit_circles_by_frequency, extract_theta_by_freque
 if __name__ == '__main__':
      headers, data = read_csv_file(f'/Users/minerva/Lab/SolarFlow/data/R_4_08_30_freq_sweep.csv',
                                    delimiter=',',
-                                   start_line=3)
+                                   start_line=3,
+                                   cache=True)
 
      frequencies = get_unique_frequencies(data)
      
@@ -44,8 +45,7 @@ if __name__ == '__main__':
 
      # Fit inverse quadratic to radius vs. omega and plot fit
      radii = [circle_fits[freq][2] for freq in selected_frequencies]
-     custom_initial_guess = [0, 1e16, 4.5e5]
-     result = fit_data(selected_frequencies, radii, 'Inverse Quadratic', inverse_quadratic, initial_guess=custom_initial_guess)
+     result = fit_data(selected_frequencies, radii, 'Inverse Quadratic', inverse_quadratic)
      print(f"Result: {result}")
      plot_fit(ax, selected_frequencies, result, 'Inverse Quadratic', inverse_quadratic, color='b', x_scale=1e3)
 
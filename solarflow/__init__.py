@@ -1 +1,19 @@
-"""Import local modules"""
\ No newline at end of file
+"""Import local modules"""
+import importlib
+
+# The compute-only core never imports matplotlib; pandas and scipy load on first use
+from solarflow import inout, data, analysis, fit
+
+__version__ = '0.0.1'
+
+# Everything else, including plotting, is imported on first attribute access
+_LAZY_SUBMODULES = ('batch', 'benchmark', 'cache', 'chunked', 'circuit', 'cli', 'continuation', 'decimate', 'export', 'pipeline', 'plot',
+                    'profiling', 'store', 'stream', 'sweep', 'synthetic', 'uncertainty')
+
+def __getattr__(name):
+    if name in _LAZY_SUBMODULES:
+        return importlib.import_module(f"solarflow.{name}")
+    raise AttributeError(f"module 'solarflow' has no attribute {name!r}")
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_SUBMODULES))
@@ -0,0 +1,5 @@
+import sys
+
+from solarflow.cli import main
+
+sys.exit(main())
@@ -1,20 +1,48 @@
+from collections import namedtuple
 import numpy as np
-from scipy.optimize import least_squares
+
+from solarflow.continuation import fit_in_sequence
+from solarflow.profiling import instrumented, record
 
 # Residuals for least squares fitting
 def residuals(params, points):
     xc, yc, r = params
     return np.sqrt((points[:, 0] - xc) ** 2 + (points[:, 1] - yc) ** 2) - r
 
+# Analytic Jacobian of residuals with respect to (xc, yc, r)
+def residuals_jacobian(params, points):
+    xc, yc, r = params
+    dx, dy = points[:, 0] - xc, points[:, 1] - yc
+    distance = np.sqrt(dx ** 2 + dy ** 2)
+    return np.column_stack([-dx / distance, -dy / distance, -np.ones_like(distance)])
+
+def _circle_guess(points):
+    return np.array(np.mean(points, axis=0).tolist() + [np.mean(np.std(points, axis=0))])
+
+def _circle_least_squares(points, initial_guess=None):
+    from scipy.optimize import least_squares
+    if initial_guess is None:
+        initial_guess = _circle_guess(points)
+    result = least_squares(residuals, initial_guess, jac=residuals_jacobian, args=(points,))
+    record(nfev=result.nfev, njev=result.njev)
+    return result
+
 # Fit single circle and return center and radius
-def _fit_circle(points):
-    initial_guess = np.mean(points, axis=0).tolist() + [np.mean(np.std(points, axis=0))]
-    result = least_squares(residuals, initial_guess, args=(points,))
-    xc, yc, r = result.x
+def _fit_circle(points, initial_guess=None):
+    xc, yc, r = _circle_least_squares(points, initial_guess).x
     return xc, yc, r
 
 # Fit circles by frequency
-def fit_circles_by_frequency(frequencies, impedance_data_real, impedance_data_im):
+@instrumented
+def fit_circles_by_frequency(frequencies, impedance_data_real, impedance_data_im, method='least_squares', refine=False,
+                             warm_start=False, prior=None):
+    if method != 'least_squares':
+        fit_results, _ = fit_circles_batched(frequencies, impedance_data_real, impedance_data_im, method=method, refine=refine)
+        return fit_results
+    if warm_start or prior:
+        fit_results, _ = fit_circles_in_sequence(frequencies, impedance_data_real, impedance_data_im, prior=prior)
+        return fit_results
+    record(frequencies=len(frequencies))
     fit_results = {}
     for frequency in frequencies:
         points = np.array([impedance_data_real[frequency], impedance_data_im[frequency]]).T
@@ -22,12 +50,322 @@ def fit_circles_by_frequency(frequencies, impedance_data_real, impedance_data_im
         fit_results[frequency] = (xc, yc, r)
     return fit_results
 
+@instrumented
+def fit_circles_in_sequence(frequencies, impedance_data_real, impedance_data_im, prior=None, measure_savings=False):
+    """
+    Fit circles frequency by frequency, starting each from the previous frequency's circle or from the
+    {frequency: (xc, yc, r)} solutions of a prior run; see continuation.fit_in_sequence.
+    Points with a blank coordinate are left out.
+    Return ({frequency: (xc, yc, r)}, continuation report).
+    """
+    points = {frequency: np.array([impedance_data_real[frequency], impedance_data_im[frequency]], dtype=float).T for frequency in frequencies}
+    points = {frequency: values[np.all(np.isfinite(values), axis=1)] for frequency, values in points.items()}
+    results, report = fit_in_sequence(frequencies, lambda frequency, guess: _circle_least_squares(points[frequency], guess),
+                                      lambda frequency: _circle_guess(points[frequency]),
+                                      num_points=lambda frequency: len(points[frequency]), prior=prior,
+                                      measure_savings=measure_savings)
+    record(frequencies=len(frequencies))
+    return {frequency: tuple(results[frequency].x) for frequency in frequencies}, report
+
+@instrumented
+def stack_groups(frequencies, *data_by_frequency):
+    """
+    Concatenate {frequency: values} dictionaries into flat arrays plus the group id of every value.
+    """
+    counts = np.array([len(data_by_frequency[0][frequency]) for frequency in frequencies], dtype=np.intp)
+    group_ids = np.repeat(np.arange(len(frequencies)), counts)
+    columns = [np.concatenate([np.asarray(data[frequency], dtype=float) for frequency in frequencies]) if len(frequencies) else np.array([])
+               for data in data_by_frequency]
+    return columns, group_ids, counts
+
+@instrumented
+def circle_scatter(x, y, group_ids, num_groups, origin):
+    """
+    Return the (num_groups, 4, 4) scatter matrices sum(w w^T) of w = (u^2 + v^2, u, v, 1),
+    where (u, v) are the points of each group relative to that group's origin.
+    These sums are additive, so scatters of separate batches of points can simply be added.
+    """
+    u = x - origin[group_ids, 0]
+    v = y - origin[group_ids, 1]
+    z = u ** 2 + v ** 2
+    features = [z, u, v, np.ones_like(u)]
+    scatter = np.empty((num_groups, 4, 4))
+    for i in range(4):
+        for j in range(i, 4):
+            scatter[:, i, j] = scatter[:, j, i] = np.bincount(group_ids, weights=features[i] * features[j], minlength=num_groups)
+    return scatter
+
+_PRATT_CONSTRAINT = np.array([[0., 0., 0., -2.], [0., 1., 0., 0.], [0., 0., 1., 0.], [-2., 0., 0., 0.]])
+
+@instrumented
+def solve_circle_scatter(scatter, origin, method='taubin'):
+    """
+    Solve algebraic circle fits (Kasa, Pratt or Taubin) for every group from its scatter matrix.
+    Return arrays of centers and radii; groups with fewer than three distinct points, or only collinear ones, are NaN.
+    """
+    count = scatter[:, 3, 3]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_u = scatter[:, 1, 3] / count
+        mean_v = scatter[:, 2, 3] / count
+        spread = np.sqrt(np.maximum((scatter[:, 1, 1] + scatter[:, 2, 2]) / count - mean_u ** 2 - mean_v ** 2, 0))
+    valid = (count >= 3) & (spread > 0)
+    mean_u, mean_v = np.where(valid, mean_u, 0), np.where(valid, mean_v, 0)
+    spread = np.where(valid, spread, 1)
+
+    # Center and scale each group: p = (u - mean_u) / spread, q = (v - mean_v) / spread
+    transform = np.zeros_like(scatter)
+    transform[:, 0, 0] = 1 / spread ** 2
+    transform[:, 0, 1] = -2 * mean_u / spread ** 2
+    transform[:, 0, 2] = -2 * mean_v / spread ** 2
+    transform[:, 0, 3] = (mean_u ** 2 + mean_v ** 2) / spread ** 2
+    transform[:, 1, 1] = transform[:, 2, 2] = 1 / spread
+    transform[:, 1, 3] = -mean_u / spread
+    transform[:, 2, 3] = -mean_v / spread
+    transform[:, 3, 3] = 1
+    moments = transform @ scatter @ np.swapaxes(transform, 1, 2)
+    moments[~valid] = np.eye(4)
+    moments /= moments[:, 3:, 3:]
+    # Collinear points leave the (p, q) covariance singular and lie on no finite circle
+    valid &= moments[:, 1, 1] * moments[:, 2, 2] - moments[:, 1, 2] ** 2 > 1e-12
+    moments[~valid] = np.eye(4)
+
+    # Coefficients (a, b, c, d) of a (p^2 + q^2) + b p + c q + d = 0
+    if method == 'kasa':
+        coefficients = np.ones((len(scatter), 4))
+        coefficients[:, 1:] = np.linalg.solve(moments[:, 1:, 1:], -moments[:, 1:, 0:1])[..., 0]
+    elif method == 'taubin':
+        # Eliminate d, then minimise subject to 4 a^2 mean(p^2 + q^2) + b^2 + c^2 = 1
+        reduced = moments[:, :3, :3] - moments[:, :3, 3:] * moments[:, 3:, :3] / moments[:, 3:, 3:]
+        scale = np.ones((len(scatter), 3))
+        scale[:, 0] = 1 / (2 * np.sqrt(np.where(valid, moments[:, 0, 3], 1)))
+        _, eigenvectors = np.linalg.eigh(scale[:, :, None] * reduced * scale[:, None, :])
+        abc = scale * eigenvectors[:, :, 0]
+        d = -np.einsum('gi,gi->g', moments[:, 3, :3], abc) / moments[:, 3, 3]
+        coefficients = np.column_stack([abc, d])
+    elif method == 'pratt':
+        # Smallest non-negative generalised eigenvalue of M A = eta N A with b^2 + c^2 - 4 a d = 1
+        eigenvalues, eigenvectors = np.linalg.eig(np.linalg.solve(_PRATT_CONSTRAINT, moments))
+        eigenvalues = np.where(eigenvalues.real >= -1e-12, eigenvalues.real, np.inf)
+        choice = np.argmin(eigenvalues, axis=1)
+        coefficients = eigenvectors.real[np.arange(len(scatter)), :, choice]
+    else:
+        raise ValueError(f"Unknown circle fit method: {method}")
+
+    a, b, c, d = coefficients.T
+    with np.errstate(divide='ignore', invalid='ignore'):
+        xc = origin[:, 0] + mean_u - spread * b / (2 * a)
+        yc = origin[:, 1] + mean_v - spread * c / (2 * a)
+        r = spread * np.sqrt(np.maximum(b ** 2 + c ** 2 - 4 * a * d, 0)) / (2 * np.abs(a))
+    valid &= np.isfinite(xc) & np.isfinite(yc) & np.isfinite(r)
+    xc[~valid] = yc[~valid] = r[~valid] = np.nan
+    return xc, yc, r
+
+def _geometric_cost(x, y, group_ids, num_groups, params):
+    distance = np.sqrt((x - params[group_ids, 0]) ** 2 + (y - params[group_ids, 1]) ** 2)
+    return np.bincount(group_ids, weights=(distance - params[group_ids, 2]) ** 2, minlength=num_groups)
+
+@instrumented
+def refine_circles(x, y, group_ids, num_groups, params, max_iterations=50, tolerance=1e-10):
+    """
+    Refine circle fits of every group at once by minimising the geometric residuals with
+    Levenberg-Marquardt steps built from the analytic Jacobian.
+    Return the refined (num_groups, 3) parameters, the iterations taken and a convergence flag per group.
+    """
+    params = np.array(params, dtype=float)
+    damping = np.full(num_groups, 1e-3)
+    cost = _geometric_cost(x, y, group_ids, num_groups, params)
+    converged = ~np.all(np.isfinite(params), axis=1)
+    iterations = np.zeros(num_groups, dtype=int)
+    for _ in range(max_iterations):
+        active = ~converged
+        if not active.any():
+            break
+        iterations[active] += 1
+        dx = x - params[group_ids, 0]
+        dy = y - params[group_ids, 1]
+        distance = np.sqrt(dx ** 2 + dy ** 2)
+        residual = distance - params[group_ids, 2]
+        # Groups without a circle carry NaN parameters and are left out by `converged`
+        with np.errstate(divide='ignore', invalid='ignore'):
+            jacobian = [-dx / distance, -dy / distance, -np.ones_like(distance)]
+        normal = np.empty((num_groups, 3, 3))
+        gradient = np.empty((num_groups, 3))
+        for i in range(3):
+            gradient[:, i] = np.bincount(group_ids, weights=jacobian[i] * residual, minlength=num_groups)
+            for j in range(i, 3):
+                normal[:, i, j] = normal[:, j, i] = np.bincount(group_ids, weights=jacobian[i] * jacobian[j], minlength=num_groups)
+        diagonal = np.einsum('gii->gi', normal)
+        damped = normal + damping[:, None, None] * diagonal[:, :, None] * np.eye(3)
+        damped[converged] = np.eye(3)
+        step = np.linalg.solve(damped, -gradient[:, :, None])[..., 0]
+        trial = params + step
+        trial_cost = _geometric_cost(x, y, group_ids, num_groups, trial)
+        improved = active & (trial_cost < cost)
+        small_step = np.linalg.norm(step, axis=1) <= tolerance * (np.linalg.norm(params, axis=1) + tolerance)
+        small_change = improved & (cost - trial_cost <= tolerance * cost)
+        params[improved] = trial[improved]
+        cost[improved] = trial_cost[improved]
+        damping = np.where(improved, damping / 10, damping * 10)
+        converged |= active & (small_step | small_change | (damping > 1e16))
+    params[:, 2] = np.abs(params[:, 2])
+    return params, iterations, converged
+
+@instrumented
+def fit_circles_batched(frequencies, impedance_data_real, impedance_data_im, method='taubin', refine=False, max_iterations=50, tolerance=1e-10):
+    """
+    Fit circles to every frequency in one vectorised algebraic pass, optionally followed by a batched
+    geometric refinement. Return {frequency: (xc, yc, r)} and {frequency: diagnostics}.
+    """
+    (x, y), group_ids, counts = stack_groups(frequencies, impedance_data_real, impedance_data_im)
+    num_groups = len(frequencies)
+    # Blank cells are NaN and would poison the sums of their frequency
+    finite = np.isfinite(x) & np.isfinite(y)
+    if not finite.all():
+        x, y, group_ids = x[finite], y[finite], group_ids[finite]
+        counts = np.bincount(group_ids, minlength=num_groups)
+    origin = np.zeros((num_groups, 2))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        origin[:, 0] = np.bincount(group_ids, weights=x, minlength=num_groups) / counts
+        origin[:, 1] = np.bincount(group_ids, weights=y, minlength=num_groups) / counts
+    origin = np.nan_to_num(origin)
+    scatter = circle_scatter(x, y, group_ids, num_groups, origin)
+    params = np.column_stack(solve_circle_scatter(scatter, origin, method=method))
+    iterations = np.zeros(num_groups, dtype=int)
+    converged = np.all(np.isfinite(params), axis=1)
+    if refine:
+        params, iterations, converged = refine_circles(x, y, group_ids, num_groups, params, max_iterations=max_iterations, tolerance=tolerance)
+        converged &= np.all(np.isfinite(params), axis=1)
+    record(rows=len(x), frequencies=num_groups, iterations=int(iterations.sum()))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rms_residual = np.sqrt(_geometric_cost(x, y, group_ids, num_groups, params) / counts)
+
+    fit_results = {}
+    diagnostics = {}
+    for group_idx, frequency in enumerate(frequencies):
+        xc, yc, r = params[group_idx]
+        fit_results[frequency] = (xc, yc, r)
+        diagnostics[frequency] = {
+            'method': method,
+            'n_points': int(counts[group_idx]),
+            'rms_residual': float(rms_residual[group_idx]),
+            'iterations': int(iterations[group_idx]),
+            'converged': bool(converged[group_idx]),
+        }
+    return fit_results, diagnostics
+
+@instrumented
 def extract_theta_by_frequency(freqs, impedance_data_real, impedance_data_im, circle_fits):
     return {freq: np.arctan2(impedance_data_im[freq]- circle_fits[freq][1], impedance_data_real[freq] - circle_fits[freq][0]) for freq in freqs}
 
+@instrumented
+def line_of_bijection(circle_fits):
+    """
+    Return (apex xc, apex yc, angle in radians) of the line from the origin through the apex center,
+    the circle center closest to the origin.
+    """
+    centers = np.array([(xc, yc) for xc, yc, _ in circle_fits.values()], dtype=float)
+    centers = centers[np.all(np.isfinite(centers), axis=1)]
+    if len(centers) == 0:
+        return np.nan, np.nan, np.nan
+    apex_xc, apex_yc = centers[np.argmin(np.hypot(centers[:, 0], centers[:, 1]))]
+    return apex_xc, apex_yc, np.arctan2(apex_yc, apex_xc)
+
 def halve_data(data_list):
     half_length = len(data_list[0]) // 2
     first_half = [data[:half_length] for data in data_list]
     second_half = [data[half_length:] for data in data_list]
     return first_half, second_half
 
+# Monotonic sweep branches; frequency index `group` covers voltage_data[frequencies[group]][start:stop]
+Branches = namedtuple('Branches', ['group', 'start', 'stop', 'direction'])
+
+def _turning_point(values, start, direction, tolerance, window=64):
+    """
+    Follow `values` from `start` in `direction` (+1 rising, -1 falling) until they retreat more than `tolerance`
+    from their running extremum. Return (index of the extremum, index of the retreat), or (None, None) if they
+    never retreat. Held values at the extremum belong to the branch that reached it, so the last tie is returned.
+    Windows grow geometrically, so each branch costs time in proportion to its length.
+    """
+    extreme = -np.inf
+    position = start
+    while position < len(values):
+        stop = min(position + window, len(values))
+        segment = direction * values[position:stop]
+        running = np.maximum(np.maximum.accumulate(segment), extreme)
+        retreat = np.flatnonzero(segment < running - tolerance)
+        if retreat.size:
+            retreat_index = position + retreat[0]
+            reached = direction * values[start:retreat_index]
+            return retreat_index - 1 - np.argmax(reached[::-1]), retreat_index
+        extreme = running[-1]
+        position, window = stop, 2 * window
+    return None, None
+
+def _sweep_noise(values):
+    """
+    Robust standard deviation of the noise on a piecewise-linear sweep, from the median absolute second
+    difference, which a constant voltage step leaves untouched. Zero for clean or held voltages.
+    """
+    if len(values) < 3:
+        return 0.0
+    second_difference = np.diff(values, 2)
+    return 1.4826 * np.median(np.abs(second_difference - np.median(second_difference))) / np.sqrt(6)
+
+def _segment_group(values, tolerance):
+    """
+    Return (stops, directions) of the monotonic branches of one frequency's finite voltages, in sweep order.
+    """
+    # The first branch heads whichever way the voltage first moves by more than the tolerance
+    _, rise = _turning_point(values, 0, -1, tolerance)
+    _, fall = _turning_point(values, 0, 1, tolerance)
+    if rise is None and fall is None:
+        return [len(values)], [int(np.sign(values[-1] - values[0])) if len(values) else 0]
+    direction = 1 if fall is None or (rise is not None and rise < fall) else -1
+    stops, directions = [], []
+    start = 0
+    while True:
+        extremum, _ = _turning_point(values, start, direction, tolerance)
+        directions.append(direction)
+        if extremum is None:
+            stops.append(len(values))
+            return stops, directions
+        stops.append(extremum + 1)
+        start, direction = extremum + 1, -direction
+
+@instrumented
+def segment_sweeps(frequencies, voltage_data, tolerance=None, min_points=2, noise_multiple=10.0):
+    """
+    Split the voltage sweep of every frequency into monotonic branches at its turning points.
+    A branch only ends once the voltage has retreated more than `tolerance` from the branch's running
+    extremum, and then ends at that extremum, so noise and held voltages neither start new branches nor
+    blur where the real turns are. With tolerance=None it is `noise_multiple` times each frequency's
+    estimated voltage noise, which is zero for clean ramps.
+    Each point belongs to the branch whose direction it was reached in, so a turning point ends its branch;
+    blank voltages stay with the branch they fall in. Branches with fewer than `min_points` points are left out.
+    Return Branches of index arrays; slicing with them gives views rather than copies.
+    This is not a vectorised all-frequency pass: hysteresis makes each turn depend on the previous one, so
+    frequencies and branches are followed in python, with numpy doing the work within each branch.
+    """
+    groups, starts, stops, directions = [], [], [], []
+    num_rows = 0
+    for group, frequency in enumerate(frequencies):
+        voltage = np.asarray(voltage_data[frequency], dtype=float)
+        num_rows += len(voltage)
+        positions = np.flatnonzero(np.isfinite(voltage))
+        if len(positions) == 0:
+            continue
+        values = voltage[positions]
+        group_tolerance = noise_multiple * _sweep_noise(values) if tolerance is None else tolerance
+        group_stops, group_directions = _segment_group(values, group_tolerance)
+        # Map the ends back to the full sweep, where blank points follow the turning point they come after
+        group_stops = np.append(positions[np.array(group_stops[:-1], dtype=np.intp) - 1] + 1, len(voltage))
+        groups.extend([group] * len(group_stops))
+        starts.extend(np.concatenate(([0], group_stops[:-1])))
+        stops.extend(group_stops)
+        directions.extend(group_directions)
+
+    groups, starts, stops = np.array(groups, dtype=np.intp), np.array(starts, dtype=np.intp), np.array(stops, dtype=np.intp)
+    directions = np.array(directions, dtype=np.int8)
+    keep = stops - starts >= min_points
+    record(rows=num_rows, branches=int(keep.sum()))
+    return Branches(groups[keep], starts[keep], stops[keep], directions[keep])
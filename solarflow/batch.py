@@ -0,0 +1,291 @@
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import numpy as np
+
+from solarflow.inout import read_csv_file
+from solarflow.data import FrequencyIndex
+from solarflow.analysis import fit_circles_batched, extract_theta_by_frequency, line_of_bijection
+from solarflow.fit import fit_model, get_model
+from solarflow.continuation import fit_in_sequence
+
+DEFAULT_OPTIONS = {
+    'delimiter': ',',
+    'start_line': 3,
+    'cache': False,
+    'frequency_header': 'Frequency (Hz)',
+    'real_header': "Z' (Ohm)",
+    'imaginary_header': "Z'' (Ohm)",
+    'voltage_header': 'Voltage (V)',
+    'frequencies': None,
+    'circle_method': 'taubin',
+    'refine': True,
+    'theta_model': None,
+    'voltage_cutoff': None,
+    'radius_model': None,
+    'circuit': None,
+    'warm_start': False,
+    'prior': None,
+    'prior_device': None,
+    'figure_max_points': None,
+    'figure_rasterized': False,
+    'date': None,
+}
+
+def load_manifest(manifest_path):
+    """
+    Read a JSON manifest of {"defaults": {...}, "devices": [{"key": ..., "file": ..., ...}]}.
+    Return one options dictionary per device, with relative files resolved against the manifest.
+    """
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    defaults = dict(DEFAULT_OPTIONS, **manifest.get('defaults', {}))
+    devices = []
+    for device in manifest['devices']:
+        options = dict(defaults, **device)
+        if 'key' not in options or 'file' not in options:
+            raise ValueError(f"Manifest entries need a 'key' and a 'file': {device}")
+        options['file'] = os.path.join(base_dir, os.path.expanduser(options['file']))
+        devices.append(options)
+    _check_unique_keys(devices)
+    return devices
+
+def _check_unique_keys(devices):
+    # Results are keyed by device, so a repeated key would silently replace another device's results
+    keys = [options['key'] for options in devices]
+    duplicates = sorted({str(key) for key in keys if keys.count(key) > 1})
+    if duplicates:
+        raise ValueError(f"Device keys must be unique; repeated: {', '.join(duplicates)}")
+
+def select_frequencies(unique_frequencies, selection):
+    """
+    Select frequencies with None (all), a slice string such as '5:' or '-14:-6', or a list of frequencies.
+    """
+    if selection is None:
+        return unique_frequencies
+    if isinstance(selection, str):
+        bounds = [int(bound) if bound.strip() else None for bound in selection.split(':')]
+        if len(bounds) == 1:
+            return unique_frequencies[bounds[0]:bounds[0] + 1 or None]
+        return unique_frequencies[slice(*bounds)]
+    requested = np.asarray(selection, dtype=float)
+    matches = np.isclose(unique_frequencies[:, None], requested[None, :], rtol=1e-9).any(axis=1)
+    return unique_frequencies[matches]
+
+def unmatched_frequencies(unique_frequencies, selection):
+    """
+    Return the frequencies of a list selection that match none of `unique_frequencies`, or None for other selections.
+    """
+    if selection is None or isinstance(selection, str):
+        return None
+    requested = np.asarray(selection, dtype=float)
+    matches = np.isclose(unique_frequencies[:, None], requested[None, :], rtol=1e-9).any(axis=0)
+    return requested[~matches].tolist()
+
+def _filter_voltage(voltage, theta, voltage_cutoff):
+    keep = np.isfinite(voltage) & np.isfinite(theta)
+    if voltage_cutoff is not None:
+        keep &= np.abs(voltage) > voltage_cutoff
+    return voltage[keep], theta[keep]
+
+def load_prior(prior_dir, device, frequencies):
+    """
+    Return (per-frequency rows, device summary) of `device` from a previous run's results.csv and devices.csv,
+    with row frequencies matched to `frequencies`. Either is empty if the prior run has no entry for the device.
+    """
+    import pandas as pd
+    rows, summary = {}, {}
+    results_path, devices_path = os.path.join(prior_dir, 'results.csv'), os.path.join(prior_dir, 'devices.csv')
+    if os.path.exists(results_path):
+        table = pd.read_csv(results_path)
+        for row in table[table['device'].astype(str) == str(device)].to_dict('records'):
+            matches = np.flatnonzero(np.isclose(frequencies, row['frequency'], rtol=1e-9))
+            if len(matches):
+                rows[frequencies[matches[0]]] = row
+    if os.path.exists(devices_path):
+        table = pd.read_csv(devices_path)
+        matches = table[(table['device'].astype(str) == str(device)) & (table['status'] == 'ok')].to_dict('records')
+        summary = matches[0] if matches else {}
+    return rows, summary
+
+def _prior_params(stored, prefix, parameter_names, model_key=None, model_name=None):
+    # Stored parameters are only reused when the prior run fit the same model and all of them are finite
+    if model_key is not None and stored.get(model_key) != model_name:
+        return None
+    params = np.array([stored.get(f"{prefix}{name}", np.nan) for name in parameter_names], dtype=float)
+    return params if np.all(np.isfinite(params)) else None
+
+def analyse_device(options, output_dir=None, figures=False):
+    """
+    Run ingest, grouping, circle fits, theta extraction and model fits for one device.
+    Return (rows, summary): one result row per selected frequency and a per-device summary.
+    """
+    columns = [options['frequency_header'], options['real_header'], options['imaginary_header'], options['voltage_header']]
+    _, data = read_csv_file(options['file'], verbose=False, delimiter=options['delimiter'], start_line=options['start_line'],
+                            columns=columns, cache=options['cache'])
+    index = FrequencyIndex(data, options['frequency_header'])
+    selected_frequencies = select_frequencies(index.frequencies, options['frequencies'])
+    if len(selected_frequencies) == 0:
+        raise ValueError(f"No frequencies selected by {options['frequencies']!r}")
+    impedance_data_real = index.by_frequency(options['real_header'], selected_frequencies)
+    impedance_data_im = index.by_frequency(options['imaginary_header'], selected_frequencies)
+    voltage_data = index.by_frequency(options['voltage_header'], selected_frequencies)
+
+    circle_fits, diagnostics = fit_circles_batched(selected_frequencies, impedance_data_real, impedance_data_im,
+                                                   method=options['circle_method'], refine=options['refine'])
+    theta_data = extract_theta_by_frequency(selected_frequencies, impedance_data_real, impedance_data_im, circle_fits)
+
+    prior_rows, prior_summary = {}, {}
+    if options['prior']:
+        prior_rows, prior_summary = load_prior(options['prior'], options['prior_device'] or options['key'], selected_frequencies)
+
+    summary = {'device': options['key'], 'file': options['file'], 'status': 'ok', 'n_frequencies': len(selected_frequencies)}
+    unmatched = unmatched_frequencies(index.frequencies, options['frequencies'])
+    if unmatched is not None:
+        summary['unmatched_frequencies'] = unmatched
+    # Measurement date for comparing devices over time; the file's modification date unless the manifest gives one
+    summary['date'] = options['date'] or time.strftime('%Y-%m-%d', time.localtime(os.path.getmtime(options['file'])))
+    summary['circle_method'] = options['circle_method']
+    summary['apex_xc'], summary['apex_yc'], summary['bijection_angle'] = line_of_bijection(circle_fits)
+    theta_results = {}
+    if options['theta_model']:
+        model = get_model(options['theta_model'])
+        summary['theta_model'] = model.name
+        theta_points = {frequency: _filter_voltage(voltage_data[frequency], theta_data[frequency], options['voltage_cutoff'])
+                        for frequency in selected_frequencies}
+        if options['warm_start'] or prior_rows:
+            prior = {frequency: params for frequency, params in
+                     ((frequency, _prior_params(row, 'theta_', model.parameter_names, 'theta_model', model.name))
+                      for frequency, row in prior_rows.items()) if params is not None}
+            theta_results, report = fit_in_sequence(
+                selected_frequencies, lambda frequency, guess: fit_model(*theta_points[frequency], model, initial_guess=guess),
+                lambda frequency: model.initial_guess(*theta_points[frequency]),
+                num_points=lambda frequency: len(theta_points[frequency][0]), prior=prior)
+            summary.update({f"theta_{key}": value for key, value in report.items()})
+        else:
+            theta_results = {frequency: fit_model(*theta_points[frequency], model) for frequency in selected_frequencies}
+
+    rows = []
+    for frequency in selected_frequencies:
+        xc, yc, r = circle_fits[frequency]
+        row = {'device': options['key'], 'frequency': frequency, 'xc': xc, 'yc': yc, 'r': r}
+        row.update({key: value for key, value in diagnostics[frequency].items() if key != 'method'})
+        if options['theta_model']:
+            result = theta_results[frequency]
+            row['theta_model'] = model.name
+            row.update({f"theta_{name}": value for name, value in zip(model.parameter_names, result.x)})
+            row['theta_cost'] = result.cost
+            row['theta_nfev'] = result.nfev
+        rows.append(row)
+
+    radius_fit = None
+    if options['radius_model']:
+        model = get_model(options['radius_model'])
+        radii = np.array([circle_fits[frequency][2] for frequency in selected_frequencies])
+        if len(selected_frequencies) >= len(model.parameter_names):
+            initial_guess = _prior_params(prior_summary, 'radius_', model.parameter_names, 'radius_model', model.name)
+            result = fit_model(selected_frequencies, radii, model, initial_guess=initial_guess)
+            radius_fit = (model, result.x)
+            summary['radius_model'] = model.name
+            summary.update({f"radius_{name}": value for name, value in zip(model.parameter_names, result.x)})
+            summary['radius_cost'] = result.cost
+    if options['circuit']:
+        from solarflow.circuit import get_circuit, fit_circuit
+        circuit = get_circuit(options['circuit'])
+        initial_guess = _prior_params(prior_summary, 'circuit_', circuit.parameter_names, 'circuit', circuit.description)
+        result = fit_circuit(circuit, selected_frequencies, impedance_data_real, impedance_data_im, initial_guess=initial_guess)
+        summary['circuit'] = circuit.description
+        summary.update({f"circuit_{name}": value for name, value in zip(circuit.parameter_names, result.x)})
+        summary['circuit_cost'] = result.cost
+
+    if figures and output_dir is not None:
+        _save_device_figures(os.path.join(output_dir, options['key']), selected_frequencies, impedance_data_real, impedance_data_im,
+                             circle_fits, theta_data, voltage_data, radius_fit,
+                             {'max_points': options['figure_max_points'], 'rasterized': options['figure_rasterized']})
+    return rows, summary
+
+def _save_device_figures(device_dir, selected_frequencies, impedance_data_real, impedance_data_im, circle_fits, theta_data, voltage_data, radius_fit,
+                         samples):
+    from solarflow.export import FigureJob, render_figures
+    from solarflow.plot import plot_impedance_by_frequency, plot_circle_fit, plot_theta_vs_voltage, plot_omega_vs_radius, plot_fit
+
+    radius_calls = [(plot_omega_vs_radius, (selected_frequencies, circle_fits), {'x_scale': 1e3})]
+    if radius_fit is not None:
+        model, params = radius_fit
+        radius_calls.append((plot_fit, (), {'x': selected_frequencies, 'params': params, 'func_name': model.name,
+                                            'func': model.function, 'color': 'b', 'x_scale': 1e3}))
+    jobs = [
+        FigureJob(os.path.join(device_dir, 'circle_fits.png'), [
+            (plot_impedance_by_frequency, (selected_frequencies, impedance_data_real, impedance_data_im), samples),
+            (plot_circle_fit, (circle_fits, ), {'plot_centers': True}),
+        ]),
+        FigureJob(os.path.join(device_dir, 'theta_vs_voltage.png'), [
+            (plot_theta_vs_voltage, (selected_frequencies, theta_data, voltage_data), samples),
+        ]),
+        FigureJob(os.path.join(device_dir, 'radius_vs_omega.png'), radius_calls),
+    ]
+    # Each device already runs in its own worker, so its figures are rendered inline
+    render_figures(jobs, workers=1)
+
+def _run_device(options, output_dir, figures):
+    # Failures are returned rather than raised so one bad device never stops the batch
+    try:
+        return analyse_device(options, output_dir=output_dir, figures=figures)
+    except Exception as error:
+        summary = {'device': options['key'], 'file': options['file'], 'status': 'failed',
+                   'error': f"{type(error).__name__}: {error}", 'traceback': traceback.format_exc()}
+        return [], summary
+
+def run_batch(devices, output_dir=None, workers=None, figures=False, verbose=True, store=None, description=None):
+    """
+    Analyse devices across a pool of at most `workers` processes (inline when workers is 1).
+    Return (rows, summaries) and, when `output_dir` is given, write results.csv and devices.csv there.
+    When `store` (a path or a store.ResultsStore) is given, also add the results to that results store as a new run.
+    """
+    _check_unique_keys(devices)
+    results = {}
+    if workers == 1 or len(devices) <= 1:
+        for options in devices:
+            results[options['key']] = _run_device(options, output_dir, figures)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_run_device, options, output_dir, figures): options for options in devices}
+            for future in as_completed(futures):
+                options = futures[future]
+                try:
+                    results[options['key']] = future.result()
+                except BrokenProcessPool as error:
+                    results[options['key']] = ([], {'device': options['key'], 'file': options['file'], 'status': 'failed',
+                                                    'error': f"{type(error).__name__}: {error}"})
+                if verbose:
+                    print(f"{options['key']}: {results[options['key']][1]['status']}")
+
+    rows, summaries = [], []
+    for options in devices:
+        device_rows, summary = results[options['key']]
+        rows.extend(device_rows)
+        summaries.append(summary)
+    if output_dir is not None:
+        write_results(output_dir, rows, summaries)
+    if store is not None:
+        from solarflow.store import ResultsStore
+        if isinstance(store, ResultsStore):
+            store.add_batch(devices, rows, summaries, description=description)
+        else:
+            with ResultsStore(store) as results_store:
+                results_store.add_batch(devices, rows, summaries, description=description)
+    return rows, summaries
+
+def write_results(output_dir, rows, summaries):
+    """
+    Write the per-frequency results table and the per-device summary table as csv files.
+    """
+    import pandas as pd
+    os.makedirs(output_dir, exist_ok=True)
+    pd.DataFrame(rows).to_csv(os.path.join(output_dir, 'results.csv'), index=False)
+    summary_table = pd.DataFrame(summaries)
+    summary_table.drop(columns=['traceback'], errors='ignore').to_csv(os.path.join(output_dir, 'devices.csv'), index=False)
@@ -0,0 +1,175 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+from solarflow.synthetic import synthetic_sweep, write_sweep_csv
+from solarflow.inout import read_csv_file
+from solarflow.data import get_data_by_frequency, extract_data_by_header, build_frequency_index
+from solarflow.analysis import fit_circles_by_frequency, fit_circles_batched, extract_theta_by_frequency
+from solarflow.fit import fit_data, arc_tan
+
+DEFAULT_SIZES = (10000, 100000, 1000000)
+REAL_HEADER = "Z' (Ohm)"
+IMAGINARY_HEADER = "Z'' (Ohm)"
+VOLTAGE_HEADER = 'Voltage (V)'
+# Seconds `import solarflow` may add on top of importing numpy, and modules the core must not pull in
+CORE_IMPORT_BUDGET = 0.1
+HEAVY_MODULES = ('matplotlib', 'pandas', 'scipy')
+
+def measure(function, repeat=3, memory=True):
+    """
+    Return (best wall time in seconds, peak traced allocation in bytes) of calling `function`.
+    Memory is traced in a separate call so tracing overhead does not distort the timings.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            function()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return min(timings), peak
+
+def _stages(file_name):
+    """
+    Return [(stage, callable)] for every pipeline stage on one sweep file; later stages reuse earlier outputs.
+    """
+    headers, data = read_csv_file(file_name, verbose=False, delimiter=', ', start_line=3)
+    index = build_frequency_index(data)
+    frequencies = index.frequencies
+    impedance_data_real = index.by_frequency(REAL_HEADER)
+    impedance_data_im = index.by_frequency(IMAGINARY_HEADER)
+    voltage_data = index.by_frequency(VOLTAGE_HEADER)
+    circle_fits, _ = fit_circles_batched(frequencies, impedance_data_real, impedance_data_im)
+    theta_data = extract_theta_by_frequency(frequencies, impedance_data_real, impedance_data_im, circle_fits)
+
+    def group_legacy():
+        values_by_frequency = get_data_by_frequency(data, headers)
+        for header in (REAL_HEADER, IMAGINARY_HEADER, VOLTAGE_HEADER):
+            extract_data_by_header(values_by_frequency, header)
+
+    def fit_theta():
+        for frequency in frequencies:
+            fit_data(voltage_data[frequency], theta_data[frequency], 'Arctan', arc_tan)
+
+    return [
+        ('read_csv_file', lambda: read_csv_file(file_name, verbose=False, delimiter=', ', start_line=3)),
+        ('get_data_by_frequency', group_legacy),
+        ('build_frequency_index', lambda: build_frequency_index(data).by_frequency(REAL_HEADER)),
+        ('fit_circles_by_frequency', lambda: fit_circles_by_frequency(frequencies, impedance_data_real, impedance_data_im)),
+        ('fit_circles_batched', lambda: fit_circles_batched(frequencies, impedance_data_real, impedance_data_im, refine=True)),
+        ('fit_data', fit_theta),
+    ]
+
+def measure_import_time(module='solarflow', repeat=5):
+    """
+    Return the best time in seconds to import `module` in a fresh interpreter, excluding numpy's own import,
+    and the HEAVY_MODULES that the import loaded.
+    """
+    script = (
+        "import json, sys, time\n"
+        "import numpy\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "seconds = time.perf_counter() - start\n"
+        f"print(json.dumps([seconds, [name for name in {HEAVY_MODULES!r} if name in sys.modules]]))\n"
+    )
+    timings = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script], check=True, capture_output=True, text=True).stdout
+        seconds, loaded = json.loads(output)
+        timings.append(seconds)
+    return min(timings), loaded
+
+def check_import_budget(budget=CORE_IMPORT_BUDGET, module='solarflow'):
+    """
+    Return a list of problems with the core import: exceeding `budget` seconds or loading a heavy module.
+    """
+    seconds, loaded = measure_import_time(module)
+    problems = [f"import {module} loaded {name}" for name in loaded]
+    if seconds > budget:
+        problems.append(f"import {module} took {seconds * 1e3:.1f} ms, over the {budget * 1e3:.0f} ms budget")
+    return problems
+
+def scaling_exponent(rows, seconds):
+    """
+    Return the slope of log(time) against log(rows), i.e. k in time ~ rows^k.
+    """
+    rows, seconds = np.asarray(rows, dtype=float), np.asarray(seconds, dtype=float)
+    if len(rows) < 2 or np.any(seconds <= 0):
+        return None
+    return float(np.polyfit(np.log(rows), np.log(seconds), 1)[0])
+
+def run_benchmarks(sizes=DEFAULT_SIZES, num_frequencies=16, noise=0.01, repeat=3, memory=True, stages=None, seed=0, verbose=True):
+    """
+    Time and memory-profile each pipeline stage on synthetic sweeps of every size in `sizes`.
+    Return a JSON-serialisable report with one measurement per (stage, size) and a scaling exponent per stage.
+    """
+    from solarflow import __version__
+    measurements = []
+    import_seconds, _ = measure_import_time()
+    if verbose:
+        print(f"{'import solarflow':>26} {import_seconds * 1e3:10.2f} ms")
+    with tempfile.TemporaryDirectory() as workdir:
+        for num_rows in sizes:
+            file_name = os.path.join(workdir, f"sweep_{num_rows}.csv")
+            write_sweep_csv(file_name, synthetic_sweep(num_rows, num_frequencies=num_frequencies, noise=noise, seed=seed))
+            for stage, function in _stages(file_name):
+                if stages is not None and stage not in stages:
+                    continue
+                seconds, peak_bytes = measure(function, repeat=repeat, memory=memory)
+                measurements.append({'stage': stage, 'rows': num_rows, 'seconds': seconds, 'peak_bytes': peak_bytes})
+                if verbose:
+                    peak = '' if peak_bytes is None else f", peak {peak_bytes / 2 ** 20:.1f} MiB"
+                    print(f"{stage:>26} {num_rows:>9} rows: {seconds * 1e3:10.2f} ms{peak}")
+
+    scaling = {}
+    for stage in dict.fromkeys(measurement['stage'] for measurement in measurements):
+        stage_measurements = [measurement for measurement in measurements if measurement['stage'] == stage]
+        scaling[stage] = scaling_exponent([m['rows'] for m in stage_measurements], [m['seconds'] for m in stage_measurements])
+    return {
+        'solarflow_version': __version__,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'settings': {'sizes': list(sizes), 'num_frequencies': num_frequencies, 'noise': noise, 'repeat': repeat, 'seed': seed},
+        'import_seconds': import_seconds,
+        'measurements': measurements,
+        'scaling': scaling,
+    }
+
+def save_results(results, file_name):
+    with open(file_name, 'w') as f:
+        json.dump(results, f, indent=2)
+
+def load_results(file_name):
+    with open(file_name, 'r') as f:
+        return json.load(f)
+
+def compare_results(baseline, current, tolerance=1.25):
+    """
+    Return [(stage, rows, baseline seconds, current seconds, ratio)] for measurements that got slower
+    than `tolerance` times the baseline.
+    """
+    baseline_seconds = {(m['stage'], m['rows']): m['seconds'] for m in baseline['measurements']}
+    regressions = []
+    for measurement in current['measurements']:
+        key = (measurement['stage'], measurement['rows'])
+        if key in baseline_seconds and baseline_seconds[key] > 0:
+            ratio = measurement['seconds'] / baseline_seconds[key]
+            if ratio > tolerance:
+                regressions.append((key[0], key[1], baseline_seconds[key], measurement['seconds'], ratio))
+    return regressions
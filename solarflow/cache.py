@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from solarflow.inout import read_csv_columns
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_DIR = os.environ.get('SOLARFLOW_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'solarflow', 'csv'))
+
+def file_digest(file_name, block_size=1 << 20):
+    """
+    Return the sha256 digest of a file's contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_fingerprint(file_name, key='stat'):
+    """
+    Return a fingerprint of a source file, from its size and mtime ('stat') or its contents ('content').
+    """
+    if key == 'stat':
+        stat = os.stat(file_name)
+        return f"{os.path.abspath(file_name)}:{stat.st_size}:{stat.st_mtime_ns}"
+    elif key == 'content':
+        return file_digest(file_name)
+    else:
+        raise ValueError(f"Unknown cache key: {key}")
+
+class ParseCache:
+    """
+    On-disk cache of parsed csv columns, stored as one .npy file per column so later loads can be memory-mapped.
+    Entries are keyed by the source fingerprint and parse options and evicted least-recently-used once
+    the cache grows past `max_bytes`.
+    """
+    def __init__(self, directory=None, max_bytes=None, key='stat', mmap=True):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.key = key
+        self.mmap = mmap
+
+    def entry_key(self, file_name, delimiter=',', start_line=0, columns=None, dtype=np.float64):
+        """
+        Return the cache key for a file parsed with the given options.
+        """
+        options = {
+            'version': CACHE_VERSION,
+            'source': file_fingerprint(file_name, self.key),
+            'delimiter': delimiter,
+            'start_line': start_line,
+            'columns': None if columns is None else list(columns),
+            'dtype': np.dtype(dtype).str,
+        }
+        return hashlib.sha256(json.dumps(options, sort_keys=True).encode()).hexdigest()
+
+    def _entry_path(self, entry_key):
+        return os.path.join(self.directory, entry_key)
+
+    def _load(self, entry_path):
+        meta_path = os.path.join(entry_path, 'meta.json')
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        mmap_mode = 'r' if self.mmap else None
+        data = {header: np.load(os.path.join(entry_path, f"{column_idx}.npy"), mmap_mode=mmap_mode)
+                for column_idx, header in enumerate(meta['headers'])}
+        # Touch the entry so eviction treats it as recently used
+        os.utime(meta_path)
+        return meta['headers'], data
+
+    def _store(self, entry_path, file_name, headers, data):
+        os.makedirs(self.directory, exist_ok=True)
+        staging_path = tempfile.mkdtemp(dir=self.directory, prefix='.staging-')
+        try:
+            for column_idx, header in enumerate(headers):
+                np.save(os.path.join(staging_path, f"{column_idx}.npy"), data[header])
+            with open(os.path.join(staging_path, 'meta.json'), 'w') as f:
+                json.dump({'source': os.path.abspath(file_name), 'headers': headers}, f)
+            os.rename(staging_path, entry_path)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(staging_path, ignore_errors=True)
+            if not os.path.isdir(entry_path):
+                raise
+
+    def read(self, file_name, delimiter=',', start_line=0, columns=None, dtype=np.float64, verbose=False):
+        """
+        Return (headers, data) for a csv file, parsing it only if no cached entry matches.
+        """
+        entry_path = self._entry_path(self.entry_key(file_name, delimiter, start_line, columns, dtype))
+        if os.path.isdir(entry_path):
+            if verbose:
+                print(f"Loaded {file_name} from cache {entry_path}")
+            return self._load(entry_path)
+        headers, data = read_csv_columns(file_name, columns=columns, dtype=dtype, delimiter=delimiter,
+                                         start_line=start_line, verbose=verbose)
+        self._store(entry_path, file_name, headers, data)
+        if self.max_bytes is not None:
+            # The new entry is returned even if it alone exceeds max_bytes
+            self.evict(keep=[entry_path])
+        return self._load(entry_path)
+
+    def entries(self):
+        """
+        Return a list of (entry path, source file, size in bytes, last access time), oldest first.
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            entry_path = os.path.join(self.directory, name)
+            meta_path = os.path.join(entry_path, 'meta.json')
+            if name.startswith('.') or not os.path.isfile(meta_path):
+                continue
+            with open(meta_path, 'r') as f:
+                source = json.load(f)['source']
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_path))
+            entries.append((entry_path, source, size, os.stat(meta_path).st_mtime))
+        return sorted(entries, key=lambda entry: entry[3])
+
+    def size(self):
+        """
+        Return the total size of the cache in bytes.
+        """
+        return sum(entry[2] for entry in self.entries())
+
+    def evict(self, max_bytes=None, keep=()):
+        """
+        Remove least-recently-used entries until the cache fits in `max_bytes`, never removing the entry paths in `keep`.
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        keep = {os.path.abspath(entry_path) for entry_path in keep}
+        entries = self.entries()
+        total = sum(entry[2] for entry in entries)
+        for entry_path, _, size, _ in entries:
+            if total <= max_bytes:
+                break
+            if os.path.abspath(entry_path) in keep:
+                continue
+            shutil.rmtree(entry_path, ignore_errors=True)
+            total -= size
+
+    def invalidate(self, file_name=None):
+        """
+        Remove the cached entries of `file_name`, or every entry when no file is given.
+        """
+        source = None if file_name is None else os.path.abspath(file_name)
+        for entry_path, entry_source, _, _ in self.entries():
+            if source is None or entry_source == source:
+                shutil.rmtree(entry_path, ignore_errors=True)
+
+def read_csv_cached(file_name, cache=True, **options):
+    """
+    Read a csv file through `cache`, which may be a ParseCache, a cache directory or True for the default cache.
+    """
+    if cache is True:
+        cache = ParseCache()
+    elif isinstance(cache, (str, os.PathLike)):
+        cache = ParseCache(directory=os.fspath(cache))
+    return cache.read(file_name, **options)
@@ -0,0 +1,192 @@
+import glob
+import os
+from collections import namedtuple
+import numpy as np
+
+from solarflow.inout import read_csv_chunks
+from solarflow.stream import CircleAccumulator
+from solarflow.decimate import DECIMATION_METHODS
+from solarflow.profiling import instrumented, record
+
+# Per-frequency reductions of a sweep file: {frequency: ...} dictionaries unless noted.
+# voltage_edges and voltage_histograms are per frequency; theta_edges is shared by every theta histogram.
+# samples maps each header, and 'theta', to decimated {frequency: values} for plotting.
+# partitions maps each header to {frequency: read-only memmap} of every value when spilled, else None.
+SweepReduction = namedtuple('SweepReduction', ['frequencies', 'counts', 'circle_fits', 'voltage_edges', 'voltage_histograms',
+                                               'theta_edges', 'theta_histograms', 'samples', 'partitions'])
+
+def _group_chunk(frequency):
+    """
+    Return (unique frequencies, stable order of the rows by frequency, offsets of each frequency's rows in that order).
+    """
+    order = np.argsort(frequency, kind='stable')
+    unique, counts = np.unique(frequency[order], return_counts=True)
+    return unique, order, np.concatenate(([0], np.cumsum(counts)))
+
+class PartitionWriter:
+    """
+    Append each frequency's values of every column to its own raw file, then reopen them as read-only memory maps.
+    Only the current chunk is ever held in memory. Partitions left in `directory` by an earlier writer are removed.
+    """
+    def __init__(self, directory, headers, dtype=np.float64):
+        self.directory = directory
+        self.headers = list(headers)
+        self.dtype = np.dtype(dtype)
+        self.counts = {}
+        self._names = {}
+        os.makedirs(directory, exist_ok=True)
+        # Files are opened for appending, so stale partitions would be read back as part of this run
+        for path in glob.glob(os.path.join(directory, 'partition_*.bin')):
+            os.remove(path)
+
+    def _path(self, frequency, column):
+        if frequency not in self._names:
+            self._names[frequency] = len(self._names)
+        return os.path.join(self.directory, f"partition_{self._names[frequency]}_{column}.bin")
+
+    def append(self, frequency, data):
+        unique, order, offsets = _group_chunk(frequency)
+        for column, header in enumerate(self.headers):
+            values = np.ascontiguousarray(data[header][order], dtype=self.dtype)
+            for i, value in enumerate(unique):
+                with open(self._path(value, column), 'ab') as f:
+                    values[offsets[i]:offsets[i + 1]].tofile(f)
+        for i, value in enumerate(unique):
+            self.counts[value] = self.counts.get(value, 0) + int(offsets[i + 1] - offsets[i])
+
+    def partitions(self):
+        """
+        Return {header: {frequency: memmap}} over everything appended so far.
+        """
+        return {header: {frequency: np.memmap(self._path(frequency, column), dtype=self.dtype, mode='r', shape=(count, ))
+                         for frequency, count in sorted(self.counts.items())}
+                for column, header in enumerate(self.headers)}
+
+class SampleReducer:
+    """
+    Keep a bounded, shape-preserving sample of (x, y) per frequency while chunks stream past.
+    Every chunk and the sample kept so far share `max_points` in proportion to the rows they stand for,
+    so early and late parts of a long sweep stay equally represented.
+    """
+    def __init__(self, max_points=2000, method='minmax'):
+        if method not in DECIMATION_METHODS:
+            raise ValueError(f"Unknown decimation method: {method}")
+        self.max_points = max_points
+        self.decimate = DECIMATION_METHODS[method]
+        self.samples = {}
+        self.seen = {}
+
+    def _reduce(self, x, y, budget):
+        if len(x) <= budget:
+            return x, y
+        keep = self.decimate(x, y, np.array([len(x)]), max(int(budget), 4))
+        return x[keep], y[keep]
+
+    def update(self, frequency, x, y):
+        finite = np.isfinite(x) & np.isfinite(y)
+        frequency, x, y = frequency[finite], x[finite], y[finite]
+        unique, order, offsets = _group_chunk(frequency)
+        x, y = x[order], y[order]
+        for i, value in enumerate(unique):
+            new_x, new_y = x[offsets[i]:offsets[i + 1]], y[offsets[i]:offsets[i + 1]]
+            seen = self.seen.get(value, 0)
+            total = seen + len(new_x)
+            new_x, new_y = self._reduce(new_x, new_y, self.max_points * len(new_x) / total)
+            if value in self.samples:
+                old_x, old_y = self._reduce(*self.samples[value], self.max_points * seen / total)
+                new_x, new_y = np.concatenate([old_x, new_x]), np.concatenate([old_y, new_y])
+            self.samples[value] = (new_x, new_y)
+            self.seen[value] = total
+
+def _histogram(values, group_ids, lower, upper, bins, num_groups):
+    """
+    Return (num_groups, bins) counts of `values` between each group's `lower` and `upper` bounds.
+    """
+    finite = np.isfinite(values)
+    values, group_ids = values[finite], group_ids[finite]
+    width = np.where(upper > lower, upper - lower, 1.0)[group_ids]
+    index = np.clip(((values - lower[group_ids]) / width * bins).astype(np.intp), 0, bins - 1)
+    return np.bincount(group_ids * bins + index, minlength=num_groups * bins).reshape(num_groups, bins)
+
+@instrumented
+def reduce_sweep_file(file_name, delimiter=',', start_line=0, frequency_header='Frequency (Hz)', real_header="Z' (Ohm)",
+                      imaginary_header="Z'' (Ohm)", voltage_header='Voltage (V)', chunk_rows=1000000, method='taubin',
+                      bins=64, max_points=2000, decimation='minmax', spill_dir=None):
+    """
+    Reduce a sweep file of any size in two passes of at most `chunk_rows` rows, parsing only the four columns used.
+    The first pass accumulates circle-fit scatter matrices, voltage ranges and decimated Z samples and, when
+    `spill_dir` is given, appends every frequency's values to memory-mapped partitions there, replacing any
+    partitions an earlier reduction left behind.
+    The second pass, over the partitions or the file again, bins voltage and theta (which needs the circle fits)
+    into `bins` histograms per frequency and keeps decimated theta-vs-voltage samples.
+    Memory depends on chunk_rows, bins, max_points and the number of frequencies, not on the file size.
+    Return a SweepReduction.
+    """
+    columns = [frequency_header, real_header, imaginary_header, voltage_header]
+    accumulator = CircleAccumulator(method=method)
+    impedance_samples = SampleReducer(max_points, decimation)
+    writer = PartitionWriter(spill_dir, columns[1:]) if spill_dir is not None else None
+    voltage_min, voltage_max, counts = {}, {}, {}
+
+    for chunk in read_csv_chunks(file_name, columns=columns, delimiter=delimiter, start_line=start_line, chunk_rows=chunk_rows):
+        frequency = chunk[frequency_header]
+        valid = np.isfinite(frequency) & (frequency != 0)
+        chunk = {header: values[valid] for header, values in chunk.items()}
+        frequency = chunk[frequency_header]
+        accumulator.update(frequency, chunk[real_header], chunk[imaginary_header])
+        impedance_samples.update(frequency, chunk[real_header], chunk[imaginary_header])
+        if writer is not None:
+            writer.append(frequency, chunk)
+        unique, order, offsets = _group_chunk(frequency)
+        voltage = chunk[voltage_header][order]
+        for i, value in enumerate(unique):
+            counts[value] = counts.get(value, 0) + int(offsets[i + 1] - offsets[i])
+            segment = voltage[offsets[i]:offsets[i + 1]]
+            if np.isfinite(segment).any():
+                voltage_min[value] = np.nanmin([voltage_min.get(value, np.inf), np.nanmin(segment)])
+                voltage_max[value] = np.nanmax([voltage_max.get(value, -np.inf), np.nanmax(segment)])
+
+    frequencies = np.array(sorted(accumulator.frequencies), dtype=float)
+    circle_fits = accumulator.fits(frequencies)
+    centers = np.array([circle_fits[frequency][:2] for frequency in frequencies]).reshape(-1, 2)
+    lower = np.array([voltage_min.get(frequency, 0.0) for frequency in frequencies])
+    upper = np.array([voltage_max.get(frequency, 0.0) for frequency in frequencies])
+    theta_edges = np.linspace(-np.pi, np.pi, bins + 1)
+    voltage_counts = np.zeros((len(frequencies), bins), dtype=np.int64)
+    theta_counts = np.zeros((len(frequencies), bins), dtype=np.int64)
+    theta_samples = SampleReducer(max_points, decimation)
+
+    def second_pass(frequency, real, imaginary, voltage):
+        group_ids = np.searchsorted(frequencies, frequency)
+        known = (group_ids < len(frequencies)) & (frequencies[np.minimum(group_ids, len(frequencies) - 1)] == frequency)
+        frequency, real, imaginary, voltage, group_ids = frequency[known], real[known], imaginary[known], voltage[known], group_ids[known]
+        theta = np.arctan2(imaginary - centers[group_ids, 1], real - centers[group_ids, 0])
+        voltage_counts[:] += _histogram(voltage, group_ids, lower, upper, bins, len(frequencies))
+        theta_counts[:] += _histogram(theta, group_ids, np.full(len(frequencies), -np.pi), np.full(len(frequencies), np.pi),
+                                      bins, len(frequencies))
+        theta_samples.update(frequency, voltage, theta)
+
+    partitions = writer.partitions() if writer is not None else None
+    if partitions is not None:
+        for frequency in frequencies:
+            count = writer.counts[frequency]
+            for start in range(0, count, chunk_rows):
+                stop = min(start + chunk_rows, count)
+                second_pass(np.full(stop - start, frequency),
+                            *(np.asarray(partitions[header][frequency][start:stop]) for header in (real_header, imaginary_header, voltage_header)))
+    else:
+        for chunk in read_csv_chunks(file_name, columns=columns, delimiter=delimiter, start_line=start_line, chunk_rows=chunk_rows):
+            second_pass(chunk[frequency_header], chunk[real_header], chunk[imaginary_header], chunk[voltage_header])
+
+    record(rows=sum(counts.values()), frequencies=len(frequencies))
+    counts = {frequency: counts.get(frequency, 0) for frequency in frequencies}
+    voltage_edges = {frequency: np.linspace(lower[i], upper[i], bins + 1) for i, frequency in enumerate(frequencies)}
+    samples = {
+        real_header: {frequency: impedance_samples.samples.get(frequency, (np.array([]), np.array([])))[0] for frequency in frequencies},
+        imaginary_header: {frequency: impedance_samples.samples.get(frequency, (np.array([]), np.array([])))[1] for frequency in frequencies},
+        voltage_header: {frequency: theta_samples.samples.get(frequency, (np.array([]), np.array([])))[0] for frequency in frequencies},
+        'theta': {frequency: theta_samples.samples.get(frequency, (np.array([]), np.array([])))[1] for frequency in frequencies},
+    }
+    return SweepReduction(frequencies, counts, circle_fits, voltage_edges,
+                          {frequency: voltage_counts[i] for i, frequency in enumerate(frequencies)}, theta_edges,
+                          {frequency: theta_counts[i] for i, frequency in enumerate(frequencies)}, samples, partitions)
@@ -0,0 +1,252 @@
+import re
+from dataclasses import dataclass
+from typing import Callable, Tuple
+import numpy as np
+
+from solarflow.analysis import stack_groups
+from solarflow.profiling import instrumented, record
+
+# Element impedances of s = j*omega and their derivatives dZ/dp, stacked along the last axis
+def resistor(s, R):
+    return np.full(s.shape, R, dtype=complex)
+
+def resistor_jacobian(s, R):
+    return np.ones(s.shape + (1, ), dtype=complex)
+
+def capacitor(s, C):
+    return 1 / (s * C)
+
+def capacitor_jacobian(s, C):
+    return (-capacitor(s, C) / C)[..., None]
+
+def constant_phase_element(s, Q, alpha):
+    return 1 / (Q * s ** alpha)
+
+def constant_phase_element_jacobian(s, Q, alpha):
+    z = constant_phase_element(s, Q, alpha)
+    return np.stack([-z / Q, -z * np.log(s)], axis=-1)
+
+def warburg(s, A):
+    return A / np.sqrt(s)
+
+def warburg_jacobian(s, A):
+    return (1 / np.sqrt(s))[..., None]
+
+@dataclass(frozen=True)
+class Element:
+    """
+    A circuit element type: its impedance, analytic Jacobian, parameter bounds and an initial guess
+    computed from the angular frequencies and the impedance scale of the data.
+    """
+    name: str
+    function: Callable
+    parameter_names: Tuple[str, ...]
+    jacobian: Callable
+    bounds: Tuple[tuple, tuple]
+    estimate_initial_guess: Callable
+
+ELEMENTS = {
+    'R': Element('R', resistor, ('R', ), resistor_jacobian, ((0, ), (np.inf, )),
+                 lambda omega, scale: (0.5 * scale, )),
+    'C': Element('C', capacitor, ('C', ), capacitor_jacobian, ((0, ), (np.inf, )),
+                 lambda omega, scale: (1 / (np.median(omega) * scale), )),
+    'CPE': Element('CPE', constant_phase_element, ('Q', 'alpha'), constant_phase_element_jacobian, ((0, 0), (np.inf, 1)),
+                   lambda omega, scale: (1 / (np.median(omega) * scale), 0.9)),
+    'W': Element('W', warburg, ('A', ), warburg_jacobian, ((0, ), (np.inf, )),
+                 lambda omega, scale: (0.1 * scale * np.sqrt(np.median(omega)), )),
+}
+
+_TOKEN = re.compile(r'\s*(p\(|[(),-]|[A-Z]+[A-Za-z]*\d*)')
+_ELEMENT_NAME = re.compile(r'([A-Z]+[A-Za-z]*?)(\d*)$')
+
+class Circuit:
+    """
+    An equivalent circuit such as 'R0-p(R1,CPE1)-W1': '-' joins elements in series and p(a, b, ...) in parallel.
+    Element names are a type from ELEMENTS followed by an optional label; parameters are named
+    '<element>' for single-parameter elements and '<element>_<parameter>' otherwise, e.g. 'CPE1_alpha'.
+    """
+    def __init__(self, description):
+        self.description = description
+        self.elements = []
+        self._tokens = self._tokenize(description)
+        self._position = 0
+        self.tree = self._parse_series()
+        if self._position != len(self._tokens):
+            raise ValueError(f"Unexpected '{self._tokens[self._position]}' in circuit {description!r}")
+        del self._tokens, self._position
+
+        names = [element_name for element_name, _ in self.elements]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Circuit {description!r} has repeated element names")
+        self.parameter_names = []
+        lower, upper = [], []
+        for element_name, element in self.elements:
+            if len(element.parameter_names) == 1:
+                self.parameter_names.append(element_name)
+            else:
+                self.parameter_names.extend(f"{element_name}_{name}" for name in element.parameter_names)
+            lower.extend(element.bounds[0])
+            upper.extend(element.bounds[1])
+        self.bounds = (np.array(lower, dtype=float), np.array(upper, dtype=float))
+
+    def __repr__(self):
+        return f"Circuit({self.description!r})"
+
+    @staticmethod
+    def _tokenize(description):
+        tokens, position = [], 0
+        description = description.strip()
+        while position < len(description):
+            match = _TOKEN.match(description, position)
+            if match is None:
+                raise ValueError(f"Cannot parse circuit {description!r} at position {position}")
+            tokens.append(match.group(1))
+            position = match.end()
+        return tokens
+
+    def _next(self):
+        return self._tokens[self._position] if self._position < len(self._tokens) else None
+
+    def _expect(self, token):
+        if self._next() != token:
+            raise ValueError(f"Expected '{token}' in circuit {self.description!r}")
+        self._position += 1
+
+    def _parse_series(self):
+        children = [self._parse_term()]
+        while self._next() == '-':
+            self._position += 1
+            children.append(self._parse_term())
+        return children[0] if len(children) == 1 else ('series', children)
+
+    def _parse_term(self):
+        token = self._next()
+        if token == 'p(':
+            self._position += 1
+            children = [self._parse_series()]
+            while self._next() == ',':
+                self._position += 1
+                children.append(self._parse_series())
+            self._expect(')')
+            return ('parallel', children)
+        if token is None:
+            raise ValueError(f"Circuit {self.description!r} ends unexpectedly")
+        match = _ELEMENT_NAME.match(token)
+        if match is None or match.group(1) not in ELEMENTS:
+            raise ValueError(f"Unknown circuit element {token!r}, expected one of {', '.join(ELEMENTS)}")
+        self._position += 1
+        element = ELEMENTS[match.group(1)]
+        start = sum(len(existing.parameter_names) for _, existing in self.elements)
+        self.elements.append((token, element))
+        return ('element', element, start)
+
+    def _evaluate(self, node, s, params, jacobian):
+        """
+        Return the impedance of `node` and, if `jacobian`, its (len(s), num_params) derivatives.
+        """
+        if node[0] == 'element':
+            _, element, start = node
+            element_params = params[start:start + len(element.parameter_names)]
+            z = element.function(s, *element_params)
+            if not jacobian:
+                return z, None
+            derivatives = np.zeros(s.shape + (len(params), ), dtype=complex)
+            derivatives[:, start:start + len(element.parameter_names)] = element.jacobian(s, *element_params)
+            return z, derivatives
+
+        kind, children = node
+        results = [self._evaluate(child, s, params, jacobian) for child in children]
+        if kind == 'series':
+            z = sum(child_z for child_z, _ in results)
+            return z, sum(child_jacobian for _, child_jacobian in results) if jacobian else None
+        # Parallel: Z = 1 / sum(1 / Z_i) and dZ/dp = (Z / Z_i)^2 dZ_i/dp
+        z = 1 / sum(1 / child_z for child_z, _ in results)
+        if not jacobian:
+            return z, None
+        return z, sum(((z / child_z) ** 2)[:, None] * child_jacobian for child_z, child_jacobian in results)
+
+    def impedance(self, omega, params):
+        """
+        Return the complex impedance at angular frequencies `omega`.
+        """
+        s = 1j * np.asarray(omega, dtype=float)
+        return self._evaluate(self.tree, s, np.asarray(params, dtype=float), jacobian=False)[0]
+
+    def jacobian(self, omega, params):
+        """
+        Return the complex (len(omega), num_params) derivatives of the impedance with respect to the parameters.
+        """
+        s = 1j * np.asarray(omega, dtype=float)
+        return self._evaluate(self.tree, s, np.asarray(params, dtype=float), jacobian=True)[1]
+
+    def initial_guess(self, omega, z):
+        """
+        Return starting parameters scaled to the angular frequencies and impedances being fitted.
+        """
+        scale = np.max(np.abs(z)) if len(z) else 1.0
+        guess = []
+        for _, element in self.elements:
+            guess.extend(element.estimate_initial_guess(omega, scale))
+        return np.array(guess, dtype=float)
+
+def get_circuit(circuit):
+    """
+    Return a Circuit from a circuit description or an existing Circuit.
+    """
+    return circuit if isinstance(circuit, Circuit) else Circuit(circuit)
+
+def mean_impedance(frequencies, impedance_data_real, impedance_data_im):
+    """
+    Return (omega, mean complex impedance, number of finite samples) for every frequency with data.
+    """
+    (real, imaginary), group_ids, _ = stack_groups(frequencies, impedance_data_real, impedance_data_im)
+    finite = np.isfinite(real) & np.isfinite(imaginary)
+    num_groups = len(frequencies)
+    counts = np.bincount(group_ids[finite], minlength=num_groups)
+    total = (np.bincount(group_ids[finite], weights=real[finite], minlength=num_groups)
+             + 1j * np.bincount(group_ids[finite], weights=imaginary[finite], minlength=num_groups))
+    present = counts > 0
+    omega = 2 * np.pi * np.asarray(frequencies, dtype=float)[present]
+    return omega, total[present] / counts[present], counts[present]
+
+@instrumented
+def fit_circuit(circuit, frequencies, impedance_data_real, impedance_data_im, initial_guess=None, weighting='modulus',
+                **least_squares_options):
+    """
+    Fit an equivalent circuit jointly to every frequency of a device, taking Z = Z' + jZ'' from the
+    {frequency: values} dictionaries of extract_data_by_header or FrequencyIndex.by_frequency.
+    The model only depends on frequency, so the squared error over every sample equals a fit to the
+    per-frequency mean impedances weighted by their sample counts; only the means are evaluated.
+    weighting='modulus' divides residuals by |Z| so every decade of frequency counts; 'unit' does not.
+    Return the scipy least_squares result.
+    """
+    from scipy.optimize import least_squares
+    circuit = get_circuit(circuit)
+    omega, z, counts = mean_impedance(frequencies, impedance_data_real, impedance_data_im)
+    if weighting == 'modulus':
+        weights = np.sqrt(counts) / np.abs(z)
+    elif weighting == 'unit':
+        weights = np.sqrt(counts).astype(float)
+    else:
+        raise ValueError(f"Unknown circuit fit weighting: {weighting}")
+
+    def residuals(params):
+        difference = weights * (circuit.impedance(omega, params) - z)
+        return np.concatenate([difference.real, difference.imag])
+
+    def jacobian(params):
+        derivatives = weights[:, None] * circuit.jacobian(omega, params)
+        return np.concatenate([derivatives.real, derivatives.imag])
+
+    if initial_guess is None:
+        initial_guess = circuit.initial_guess(omega, z)
+    lower, upper = circuit.bounds
+    # Keep the start strictly inside the bounds, with margins relative to parameters as small as capacitances
+    initial_guess = np.asarray(initial_guess, dtype=float)
+    span = np.where(np.isfinite(upper - lower), upper - lower, np.maximum(np.abs(initial_guess), 1e-300))
+    initial_guess = np.clip(initial_guess, lower + 1e-6 * span, upper - 1e-6 * span)
+    options = {'jac': jacobian, 'bounds': circuit.bounds, 'x_scale': 'jac'}
+    options.update(least_squares_options)
+    result = least_squares(residuals, initial_guess, **options)
+    record(rows=int(counts.sum()), frequencies=len(omega), nfev=result.nfev, njev=result.njev or 0)
+    return result
@@ -0,0 +1,145 @@
+import argparse
+import sys
+
+def _run(args):
+    from solarflow.batch import load_manifest, run_batch
+    devices = load_manifest(args.manifest)
+    for options in devices:
+        options['warm_start'] = options['warm_start'] or args.warm_start
+        options['prior'] = args.prior or options['prior']
+    _, summaries = run_batch(devices, output_dir=args.output_dir, workers=args.workers, figures=args.figures,
+                             store=args.store, description=f"solarflow run {args.manifest}")
+    failures = [summary for summary in summaries if summary['status'] != 'ok']
+    for summary in failures:
+        print(f"{summary['device']} failed: {summary['error']}", file=sys.stderr)
+    print(f"Processed {len(summaries) - len(failures)}/{len(summaries)} devices into {args.output_dir}")
+    return 1 if failures else 0
+
+def _stream(args):
+    from solarflow.stream import stream_circle_fits
+    updates = stream_circle_fits(args.file, delimiter=args.delimiter, start_line=args.start_line, method=args.method,
+                                 poll_interval=args.poll_interval, idle_timeout=args.idle_timeout)
+    for update in updates:
+        if update.restarted:
+            print(f"{args.file} was rewritten; fitting the new sweep from scratch")
+        for frequency, (xc, yc, r) in update.circle_fits.items():
+            print(f"{frequency:g} Hz: xc={xc:.6g} yc={yc:.6g} r={r:.6g} ({len(update.theta[frequency])} new points)")
+    return 0
+
+def _reduce(args):
+    from solarflow.chunked import reduce_sweep_file
+    reduction = reduce_sweep_file(args.file, delimiter=args.delimiter, start_line=args.start_line, chunk_rows=args.chunk_rows,
+                                  method=args.method, bins=args.bins, max_points=args.max_points, spill_dir=args.spill_dir)
+    for frequency in reduction.frequencies:
+        xc, yc, r = reduction.circle_fits[frequency]
+        print(f"{frequency:g} Hz: xc={xc:.6g} yc={yc:.6g} r={r:.6g} ({reduction.counts[frequency]} points)")
+    if args.figures:
+        import os
+        from solarflow.export import FigureJob, render_figures
+        from solarflow.plot import plot_impedance_by_frequency, plot_circle_fit, plot_theta_vs_voltage
+        samples = reduction.samples
+        render_figures([
+            FigureJob(os.path.join(args.figures, 'circle_fits.png'), [
+                (plot_impedance_by_frequency, (reduction.frequencies, samples["Z' (Ohm)"], samples["Z'' (Ohm)"]), {}),
+                (plot_circle_fit, (reduction.circle_fits, ), {'plot_centers': True}),
+            ]),
+            FigureJob(os.path.join(args.figures, 'theta_vs_voltage.png'), [
+                (plot_theta_vs_voltage, (reduction.frequencies, samples['theta'], samples['Voltage (V)']), {}),
+            ]),
+        ], workers=1)
+    return 0
+
+def _benchmark(args):
+    from solarflow.benchmark import run_benchmarks, save_results, load_results, compare_results, check_import_budget
+    if args.check_imports:
+        problems = check_import_budget()
+        for problem in problems:
+            print(f"Import budget: {problem}")
+        if problems:
+            return 1
+    results = run_benchmarks(sizes=args.sizes, num_frequencies=args.frequencies, repeat=args.repeat, memory=not args.no_memory)
+    for stage, exponent in results['scaling'].items():
+        if exponent is not None:
+            print(f"{stage}: time ~ rows^{exponent:.2f}")
+    if args.output:
+        save_results(results, args.output)
+    if args.compare:
+        regressions = compare_results(load_results(args.compare), results, tolerance=args.tolerance)
+        for stage, rows, baseline_seconds, seconds, ratio in regressions:
+            print(f"Regression: {stage} at {rows} rows took {seconds * 1e3:.2f} ms vs {baseline_seconds * 1e3:.2f} ms ({ratio:.2f}x)")
+        return 1 if regressions else 0
+    return 0
+
+def _pipeline(args):
+    from solarflow.pipeline import run_pipeline
+    run_pipeline(args.config, cache_dir=args.cache_dir, force=args.force)
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='solarflow', description='Impedance sweep analysis.')
+    parser.add_argument('--profile', metavar='REPORT', help='Write per-function timings and counters as JSON.')
+    parser.add_argument('--trace', metavar='TRACE', help='Write Chrome trace events of instrumented calls.')
+    parser.add_argument('--cprofile', metavar='STATS', help='Write cProfile statistics.')
+    parser.add_argument('--profile-memory', action='store_true', help='Also record peak traced memory per function.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help='Fit every device listed in a JSON manifest.')
+    run.add_argument('manifest', help='JSON manifest of input files and per-device frequency selections.')
+    run.add_argument('-o', '--output-dir', default='output', help='Directory for results.csv, devices.csv and figures.')
+    run.add_argument('-j', '--workers', type=int, default=None, help='Maximum number of worker processes.')
+    run.add_argument('--figures', action='store_true', help='Also save circle, theta and radius figures per device.')
+    run.add_argument('--warm-start', action='store_true', help='Seed each frequency\'s theta fit from the previous frequency.')
+    run.add_argument('--prior', metavar='DIR', help='Seed fits from the results.csv and devices.csv of an earlier run.')
+    run.add_argument('--store', metavar='DB', help='Also add the results to this SQLite results store.')
+    run.set_defaults(handler=_run)
+
+    stream = subparsers.add_parser('stream', help='Follow a sweep file as it is written and print updated circle fits.')
+    stream.add_argument('file', help='Sweep csv file being appended to by the instrument.')
+    stream.add_argument('--delimiter', default=',', help='Column delimiter.')
+    stream.add_argument('--start-line', type=int, default=3, help='Line number of the header row.')
+    stream.add_argument('--method', default='kasa', choices=['kasa', 'pratt', 'taubin'], help='Algebraic circle fit.')
+    stream.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between checks for new rows.')
+    stream.add_argument('--idle-timeout', type=float, default=None, help='Stop after this many seconds without new rows.')
+    stream.set_defaults(handler=_stream)
+
+    reduce = subparsers.add_parser('reduce', help='Fit circles and histogram theta for a sweep file too large for memory.')
+    reduce.add_argument('file', help='Sweep csv file.')
+    reduce.add_argument('--delimiter', default=',', help='Column delimiter.')
+    reduce.add_argument('--start-line', type=int, default=3, help='Line number of the header row.')
+    reduce.add_argument('--chunk-rows', type=int, default=1000000, help='Rows parsed per chunk; bounds memory use.')
+    reduce.add_argument('--method', default='taubin', choices=['kasa', 'pratt', 'taubin'], help='Algebraic circle fit.')
+    reduce.add_argument('--bins', type=int, default=64, help='Voltage and theta histogram bins per frequency.')
+    reduce.add_argument('--max-points', type=int, default=2000, help='Decimated samples kept per frequency for plotting.')
+    reduce.add_argument('--spill-dir', help='Keep every value in memory-mapped per-frequency partitions here.')
+    reduce.add_argument('--figures', metavar='DIR', help='Save circle and theta figures from the decimated samples.')
+    reduce.set_defaults(handler=_reduce)
+
+    benchmark = subparsers.add_parser('benchmark', help='Time and memory-profile each pipeline stage on synthetic sweeps.')
+    benchmark.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='Rows per synthetic sweep.')
+    benchmark.add_argument('--frequencies', type=int, default=16, help='Frequencies per synthetic sweep.')
+    benchmark.add_argument('--repeat', type=int, default=3, help='Timed repetitions per stage; the best is kept.')
+    benchmark.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc peak-memory pass.')
+    benchmark.add_argument('-o', '--output', help='Save the results as JSON.')
+    benchmark.add_argument('--compare', help='Baseline JSON results to check for regressions.')
+    benchmark.add_argument('--tolerance', type=float, default=1.25, help='Slowdown ratio reported as a regression.')
+    benchmark.add_argument('--check-imports', action='store_true',
+                           help='Fail if importing the compute core exceeds its time budget or loads matplotlib, pandas or scipy.')
+    benchmark.set_defaults(handler=_benchmark)
+
+    pipeline = subparsers.add_parser('pipeline', help='Run a TOML/YAML/JSON pipeline config, recomputing only changed stages.')
+    pipeline.add_argument('config', help='Pipeline config file.')
+    pipeline.add_argument('--cache-dir', help='Directory for memoized stage outputs.')
+    pipeline.add_argument('--force', nargs='+', default=(), metavar='STAGE', help='Recompute these stages even if memoized.')
+    pipeline.set_defaults(handler=_pipeline)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not (args.profile or args.trace or args.cprofile):
+        return args.handler(args)
+    from solarflow.profiling import profile
+    with profile(report_path=args.profile, trace_path=args.trace, memory=args.profile_memory, cprofile_path=args.cprofile):
+        return args.handler(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import json
+import numpy as np
+
+from solarflow.profiling import instrumented, record
+
+def _is_diverged(result, num_points, reference_cost, divergence_factor):
+    """
+    A fit diverged if it failed, left the finite range, or its cost per point is far above the last accepted fit's.
+    """
+    if not result.success or not np.all(np.isfinite(result.x)):
+        return True
+    cost = result.cost / max(num_points, 1)
+    return reference_cost is not None and cost > divergence_factor * reference_cost
+
+@instrumented
+def fit_in_sequence(keys, fit, cold_guess, num_points=None, prior=None, divergence_factor=10.0, measure_savings=False):
+    """
+    Run `fit(key, initial_guess)` for every key in sorted order, seeding each fit with the stored solution
+    in `prior` if there is one and otherwise with the previous key's solution.
+    A fit that diverges is rerun from `cold_guess(key)` and the better of the two is kept.
+    `num_points(key)` normalises costs when comparing neighbouring fits.
+    Return ({key: least_squares result}, report) where the report counts starts, fallbacks and function
+    evaluations; with `measure_savings` every key is also fit cold to report the evaluations saved.
+    """
+    prior = prior or {}
+    results = {}
+    report = {'fits': 0, 'prior_starts': 0, 'warm_starts': 0, 'cold_starts': 0, 'fallbacks': 0, 'nfev': 0, 'njev': 0}
+    previous, reference_cost = None, None
+    for key in sorted(keys):
+        if key in prior:
+            guess, start = np.asarray(prior[key], dtype=float), 'prior_starts'
+        elif previous is not None:
+            guess, start = previous, 'warm_starts'
+        else:
+            guess, start = cold_guess(key), 'cold_starts'
+        result = fit(key, guess)
+        report['nfev'] += result.nfev
+        report['njev'] += result.njev or 0
+        points = num_points(key) if num_points is not None else 1
+        if start != 'cold_starts' and _is_diverged(result, points, reference_cost, divergence_factor):
+            cold_result = fit(key, cold_guess(key))
+            report['nfev'] += cold_result.nfev
+            report['njev'] += cold_result.njev or 0
+            report['fallbacks'] += 1
+            if not np.isfinite(result.cost) or cold_result.cost <= result.cost:
+                result = cold_result
+        report['fits'] += 1
+        report[start] += 1
+        results[key] = result
+        if result.success and np.all(np.isfinite(result.x)):
+            previous, reference_cost = result.x, result.cost / max(points, 1)
+
+    if measure_savings:
+        report['cold_nfev'] = sum(fit(key, cold_guess(key)).nfev for key in results)
+        report['nfev_saved'] = report['cold_nfev'] - report['nfev']
+    record(fits=report['fits'], fallbacks=report['fallbacks'])
+    return results, report
+
+def save_solutions(file_name, solutions):
+    """
+    Store {key: parameters} solutions, e.g. fitted parameters by frequency, as JSON for seeding a later run.
+    """
+    with open(file_name, 'w') as f:
+        json.dump([[key, [float(value) for value in params]] for key, params in solutions.items()], f)
+
+def load_solutions(file_name):
+    """
+    Return the {key: parameters} solutions written by save_solutions.
+    """
+    with open(file_name, 'r') as f:
+        return {key: np.array(params) for key, params in json.load(f)}
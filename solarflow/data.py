@@ -1,6 +1,9 @@
 import numpy as np
-from collections import defaultdict
+from collections.abc import Sequence
 
+from solarflow.profiling import instrumented, record
+
+@instrumented
 def get_unique_frequencies(data, frequency_header='Frequency (Hz)'):
     """
     Return a list of unique frequencies from the data.
@@ -9,25 +12,117 @@ def get_unique_frequencies(data, frequency_header='Frequency (Hz)'):
     unique_frequencies = unique_frequencies[~np.isnan(unique_frequencies)]
     return unique_frequencies[unique_frequencies.astype(bool)]
 
-def _build_datapoint_dict(data, headers, datapoint_idx):
+class FrequencyIndex:
     """
-    Return a dictionary of the data point.
+    Group rows of columnar data by frequency with a stable argsort and group offsets.
+    Rows keep their original order within each frequency, so every per-frequency column is a contiguous slice.
     """
-    return {header: data[header][datapoint_idx] for header in headers}
+    def __init__(self, data, frequency_header='Frequency (Hz)'):
+        self.data = data
+        self.frequency_header = frequency_header
+        frequency_column = np.asarray(data[frequency_header])
+        # NaN and zero frequencies are dropped, as in get_unique_frequencies
+        valid_rows = np.flatnonzero(~np.isnan(frequency_column) & (frequency_column != 0))
+        self.order = valid_rows[np.argsort(frequency_column[valid_rows], kind='stable')]
+        sorted_frequencies = frequency_column[self.order]
+        if len(self.order):
+            group_starts = np.flatnonzero(np.r_[True, sorted_frequencies[1:] != sorted_frequencies[:-1]])
+        else:
+            group_starts = np.array([], dtype=np.intp)
+        self.frequencies = sorted_frequencies[group_starts]
+        self.offsets = np.r_[group_starts, len(self.order)]
+        self._positions = {frequency: position for position, frequency in enumerate(self.frequencies)}
+        self._sorted_columns = {}
+
+    def __len__(self):
+        return len(self.frequencies)
+
+    def __contains__(self, frequency):
+        return frequency in self._positions
+
+    def counts(self):
+        """
+        Return the number of rows recorded at each frequency.
+        """
+        return np.diff(self.offsets)
+
+    def group_ids(self):
+        """
+        Return the position of each sorted row's frequency in `frequencies`.
+        """
+        return np.repeat(np.arange(len(self.frequencies)), self.counts())
+
+    def column(self, header):
+        """
+        Return a column reordered so that rows are grouped by frequency.
+        """
+        if header not in self._sorted_columns:
+            self._sorted_columns[header] = np.asarray(self.data[header])[self.order]
+        return self._sorted_columns[header]
+
+    def group_slice(self, frequency):
+        position = self._positions[frequency]
+        return slice(self.offsets[position], self.offsets[position + 1])
+
+    def values(self, header, frequency):
+        """
+        Return the values of a header recorded at one frequency.
+        """
+        return self.column(header)[self.group_slice(frequency)]
+
+    def by_frequency(self, header, frequencies=None):
+        """
+        Return {frequency: values} for a header, as views into the grouped column.
+        """
+        frequencies = self.frequencies if frequencies is None else frequencies
+        return {frequency: self.values(header, frequency) for frequency in frequencies}
+
+class FrequencyGroup(Sequence):
+    """
+    The rows recorded at a single frequency, read as {header: value} dictionaries on demand.
+    """
+    def __init__(self, index, frequency, headers):
+        self.index = index
+        self.frequency = frequency
+        self.headers = headers
+        self._slice = index.group_slice(frequency)
+
+    def __len__(self):
+        return self._slice.stop - self._slice.start
+
+    def __getitem__(self, datapoint_idx):
+        if isinstance(datapoint_idx, slice):
+            return [self[i] for i in range(*datapoint_idx.indices(len(self)))]
+        if datapoint_idx < 0:
+            datapoint_idx += len(self)
+        if not 0 <= datapoint_idx < len(self):
+            raise IndexError(datapoint_idx)
+        return {header: self.index.column(header)[self._slice.start + datapoint_idx] for header in self.headers}
+
+    def column(self, header):
+        return self.index.values(header, self.frequency)
+
+@instrumented
+def build_frequency_index(data, frequency_header='Frequency (Hz)'):
+    """
+    Return a FrequencyIndex over the data.
+    """
+    index = FrequencyIndex(data, frequency_header=frequency_header)
+    record(rows=len(index.order), frequencies=len(index))
+    return index
 
 # Output takes the form {frequency: [{header: value}, ]}
+@instrumented
 def get_data_by_frequency(data, headers, frequency_header='Frequency (Hz)'):
-    unique_frequencies = get_unique_frequencies(data)
-    values_by_frequency = defaultdict(list)
-
-    for datapoint_idx, frequency in enumerate(data[frequency_header]):
-        if frequency in unique_frequencies:
-            values_by_frequency[frequency].append(_build_datapoint_dict(data, headers, datapoint_idx))
-    
-    return values_by_frequency
+    index = data if isinstance(data, FrequencyIndex) else build_frequency_index(data, frequency_header)
+    return {frequency: FrequencyGroup(index, frequency, headers) for frequency in index.frequencies}
 
+@instrumented
 def extract_data_by_header(values_by_frequency, header):
     """
     Return a list of values for a given header.
     """
-    return {frequency: np.array([datapoint[header] for datapoint in values_by_frequency[frequency]]) for frequency in values_by_frequency.keys()}
\ No newline at end of file
+    if isinstance(values_by_frequency, FrequencyIndex):
+        return values_by_frequency.by_frequency(header)
+    return {frequency: group.column(header) if isinstance(group, FrequencyGroup) else np.array([datapoint[header] for datapoint in group])
+            for frequency, group in values_by_frequency.items()}
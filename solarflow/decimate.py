@@ -0,0 +1,93 @@
+import numpy as np
+
+from solarflow.analysis import stack_groups
+from solarflow.profiling import instrumented, record
+
+def _bucket_ids(counts, num_buckets):
+    """
+    Split each group's points, in order, into up to `num_buckets` equal buckets.
+    Return (global bucket id of every point, offset of every group's first point).
+    """
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    group_ids = np.repeat(np.arange(len(counts)), counts)
+    buckets = np.minimum(counts, num_buckets)
+    position = np.arange(offsets[-1]) - offsets[group_ids]
+    bucket = position * buckets[group_ids] // np.maximum(counts[group_ids], 1)
+    bucket_offsets = np.concatenate(([0], np.cumsum(buckets)))
+    return bucket_offsets[group_ids] + bucket, offsets
+
+def _bucket_extremes(values, bucket_ids):
+    """
+    Return the indices of the smallest and the largest value in every bucket.
+    """
+    order = np.lexsort((values, bucket_ids))
+    first = np.flatnonzero(np.diff(bucket_ids[order], prepend=-1))
+    last = np.append(first[1:], len(order)) - 1
+    return order[first], order[last]
+
+def minmax_indices(x, y, counts, max_points):
+    """
+    Keep the points holding the minimum and maximum of x and of y in each of max_points // 4 buckets per group.
+    """
+    bucket_ids, _ = _bucket_ids(counts, max(max_points // 4, 1))
+    return np.unique(np.concatenate(_bucket_extremes(x, bucket_ids) + _bucket_extremes(y, bucket_ids)))
+
+def triangle_indices(x, y, counts, max_points):
+    """
+    Keep each group's first and last point and, from each of max_points - 2 buckets, the point spanning the
+    largest triangle with the means of the neighbouring buckets. This is the largest-triangle-three-buckets
+    rule with bucket means in place of the previously selected point, so every bucket is chosen at once.
+    Triangle areas scale with both axes alike, so x and y need no normalising.
+    """
+    bucket_ids, offsets = _bucket_ids(counts, max(max_points - 2, 1))
+    num_buckets = bucket_ids[-1] + 1 if len(bucket_ids) else 0
+    sizes = np.bincount(bucket_ids, minlength=num_buckets)
+    mean_x = np.bincount(bucket_ids, weights=x, minlength=num_buckets) / sizes
+    mean_y = np.bincount(bucket_ids, weights=y, minlength=num_buckets) / sizes
+
+    # The neighbours of a group's first and last bucket are its first and last points
+    nonempty = np.flatnonzero(counts > 0)
+    first_bucket = bucket_ids[offsets[nonempty]]
+    last_bucket = bucket_ids[offsets[nonempty + 1] - 1]
+    previous_x, previous_y = np.roll(mean_x, 1), np.roll(mean_y, 1)
+    next_x, next_y = np.roll(mean_x, -1), np.roll(mean_y, -1)
+    previous_x[first_bucket], previous_y[first_bucket] = x[offsets[nonempty]], y[offsets[nonempty]]
+    next_x[last_bucket], next_y[last_bucket] = x[offsets[nonempty + 1] - 1], y[offsets[nonempty + 1] - 1]
+
+    ax, ay = previous_x[bucket_ids], previous_y[bucket_ids]
+    area = np.abs((ax - next_x[bucket_ids]) * (y - ay) - (ax - x) * (next_y[bucket_ids] - ay))
+    _, largest = _bucket_extremes(area, bucket_ids)
+    return np.unique(np.concatenate([largest, offsets[nonempty], offsets[nonempty + 1] - 1]))
+
+DECIMATION_METHODS = {
+    'minmax': minmax_indices,
+    'triangle': triangle_indices,
+}
+
+@instrumented
+def decimate_by_frequency(frequencies, x_data, y_data, max_points=2000, method='minmax'):
+    """
+    Reduce every frequency's (x, y) samples to at most about `max_points` points that keep the shape of the
+    trace, working on all frequencies at once. Frequencies with fewer points are returned whole, and
+    non-finite points, which are never drawn, are dropped.
+    Return ({frequency: x}, {frequency: y}) in the original sample order.
+    """
+    if method not in DECIMATION_METHODS:
+        raise ValueError(f"Unknown decimation method: {method}")
+    (x, y), group_ids, _ = stack_groups(frequencies, x_data, y_data)
+    finite = np.isfinite(x) & np.isfinite(y)
+    x, y, group_ids = x[finite], y[finite], group_ids[finite]
+    counts = np.bincount(group_ids, minlength=len(frequencies))
+
+    dense = counts > max_points
+    keep = np.ones(len(x), dtype=bool)
+    if dense.any():
+        selected = dense[group_ids]
+        kept = DECIMATION_METHODS[method](x[selected], y[selected], counts[dense], max_points)
+        keep[np.flatnonzero(selected)] = False
+        keep[np.flatnonzero(selected)[kept]] = True
+    x, y, group_ids = x[keep], y[keep], group_ids[keep]
+    record(rows=int(finite.sum()), points=len(x))
+    offsets = np.concatenate(([0], np.cumsum(np.bincount(group_ids, minlength=len(frequencies)))))
+    return ({frequency: x[offsets[i]:offsets[i + 1]] for i, frequency in enumerate(frequencies)},
+            {frequency: y[offsets[i]:offsets[i + 1]] for i, frequency in enumerate(frequencies)})
@@ -0,0 +1,57 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from solarflow.plot import plotting_defaults
+
+# A figure to render: `calls` is a list of (function, args, kwargs). Callables are invoked as
+# function(*args, axis=axis, **kwargs); strings name an Axes method, invoked as getattr(axis, name)(*args, **kwargs).
+FigureJob = namedtuple('FigureJob', ['path', 'calls', 'dpi', 'invert_yaxis'], defaults=[500, False])
+
+def new_figure(**figure_options):
+    """
+    Return a (figure, axis) pair drawn by the Agg canvas, without going through pyplot.
+    """
+    figure = Figure(**figure_options)
+    FigureCanvasAgg(figure)
+    return figure, figure.add_subplot()
+
+def save_figure(figure, path, dpi=500, bbox_inches='tight'):
+    """
+    Save a figure and release its artists straight away.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    figure.savefig(path, dpi=dpi, bbox_inches=bbox_inches)
+    figure.clear()
+
+def render_figure(job):
+    """
+    Draw and save one FigureJob with the solarflow plotting defaults. Return the saved path.
+    """
+    with matplotlib.rc_context(plotting_defaults()):
+        figure, axis = new_figure()
+        if job.invert_yaxis:
+            axis.invert_yaxis()
+        for function, args, kwargs in job.calls:
+            if isinstance(function, str):
+                getattr(axis, function)(*args, **kwargs)
+            else:
+                function(*args, axis=axis, **kwargs)
+        save_figure(figure, job.path, dpi=job.dpi)
+    return job.path
+
+def render_figures(jobs, workers=None):
+    """
+    Render FigureJobs, in up to `workers` processes (inline when workers is 1). Return the saved paths.
+    """
+    jobs = list(jobs)
+    if workers == 1 or len(jobs) <= 1:
+        return [render_figure(job) for job in jobs]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(render_figure, jobs))
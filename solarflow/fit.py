@@ -1,5 +1,7 @@
+from dataclasses import dataclass
 import numpy as np
-from scipy.optimize import least_squares
+
+from solarflow.profiling import instrumented, record
 
 def lorentzian(x, a, b, c, d):
     x = np.array(x)
@@ -25,36 +27,212 @@ def inverse_quadratic(x, a, b, c):
     x = np.array(x)
     return a + b / ((x - c) ** 2)
 
-def get_initial_guess(fit_name):
-    if fit_name == 'Lorentzian':
-        return [-1, 0, 1, 0]
-    elif fit_name == 'Arctan':
-        return [1, 1, 1, 0]
-    elif fit_name == 'Modified Lorentzian':
-        return [-1, 0, 1, 0]
-    elif fit_name == 'Gaussian':
-        return [-1, 0, 1, 0]
-    # elif fit_name == 'Inverse Quadratic':
-    #     return [0, 1e5, 1 / 1e5, 1]
-    elif fit_name == 'Inverse Quadratic':
-        return [0, 1, 1]
-    else:
-        raise ValueError(f"Unknown fit function: {fit_name}")
-
-def fit_data(x, y, fit_name, fit_function, initial_guess=None):
+# Gradients of each model with respect to its parameters, stacked along the last axis
+def _stack(x, *columns):
+    return np.stack(np.broadcast_arrays(x, *columns)[1:], axis=-1)
+
+def lorentzian_jacobian(x, a, b, c, d):
+    x = np.asarray(x, dtype=float)
+    u = (x - b) / c
+    shape = 1 / (1 + u ** 2)
+    return _stack(x, shape, 2 * a * u * shape ** 2 / c, 2 * a * u ** 2 * shape ** 2 / c, 1.0)
+
+def arc_tan_jacobian(x, a, b, c, d):
+    x = np.asarray(x, dtype=float)
+    t = b * x + c
+    slope = a * np.sign(t) / (1 + t ** 2)
+    return _stack(x, np.abs(np.arctan(t)), slope * x, slope, 1.0)
+
+def modified_lorentzian_jacobian(x, a, b, c, d):
+    x = np.asarray(x, dtype=float)
+    u = (x - b) / c
+    shape = 1 / (1 + u ** 2)
+    return _stack(x, shape, 2 * a * u * shape ** 2 / c, 2 * a * u ** 2 * shape ** 2 / c, x)
+
+def gaussian_jacobian(x, a, b, c, d):
+    x = np.asarray(x, dtype=float)
+    u = (x - b) / c
+    shape = np.exp(-u ** 2)
+    return _stack(x, shape, 2 * a * u * shape / c, 2 * a * u ** 2 * shape / c, 1.0)
+
+def inverse_quadratic_jacobian(x, a, b, c):
+    x = np.asarray(x, dtype=float)
+    offset = x - c
+    return _stack(x, 1.0, 1 / offset ** 2, 2 * b / offset ** 3)
+
+# Data-driven initial guesses
+def _finite(x, y):
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    mask = np.isfinite(x) & np.isfinite(y)
+    return x[mask], y[mask]
+
+def _outer_mask(x, fraction=0.1):
+    """
+    Select the points in the outer `fraction` of the x range on both sides.
+    """
+    low, high = np.min(x), np.max(x)
+    margin = fraction * (high - low)
+    return (x <= low + margin) | (x >= high - margin)
+
+def _peak_guess(x, deviation, width_factor=1.0):
+    peak_idx = np.argmax(np.abs(deviation))
+    amplitude = deviation[peak_idx]
+    above_half = np.abs(deviation) >= np.abs(amplitude) / 2
+    half_width = (np.max(x[above_half]) - np.min(x[above_half])) / 2
+    if not half_width > 0:
+        half_width = np.ptp(x) / 4 or 1.0
+    return amplitude, x[peak_idx], half_width * width_factor
+
+def _lorentzian_guess(x, y):
+    baseline = np.mean(y[_outer_mask(x)])
+    a, b, c = _peak_guess(x, y - baseline)
+    return [a, b, c, baseline]
+
+def _modified_lorentzian_guess(x, y):
+    outer = _outer_mask(x)
+    slope = np.sum(x[outer] * y[outer]) / np.sum(x[outer] ** 2) if np.any(x[outer] != 0) else 0.0
+    a, b, c = _peak_guess(x, y - slope * x)
+    return [a, b, c, slope]
+
+def _gaussian_guess(x, y):
+    baseline = np.mean(y[_outer_mask(x)])
+    # The half width at half maximum of exp(-u^2) is sqrt(ln 2)
+    a, b, c = _peak_guess(x, y - baseline, width_factor=1 / np.sqrt(np.log(2)))
+    return [a, b, c, baseline]
+
+def _arc_tan_guess(x, y):
+    ends = np.mean(y[_outer_mask(x)])
+    vertex_idx = np.argmin(y) if ends - np.min(y) >= np.max(y) - ends else np.argmax(y)
+    d = y[vertex_idx]
+    # Choose b so |arctan| has reached arctan(2) at half the x range from the vertex
+    b = 4 / (np.ptp(x) or 1.0)
+    a = (ends - d) / np.arctan(2)
+    return [a, b, -b * x[vertex_idx], d]
+
+def _inverse_quadratic_guess(x, y):
+    a = 0.0 if np.min(y) > 0 else np.min(y) - 0.1 * (np.ptp(y) or 1.0)
+    # 1 / sqrt(y - a) = |x - c| / sqrt(b) is linear in x on either side of the pole
+    slope, intercept = np.polyfit(x, 1 / np.sqrt(y - a), 1)
+    if slope == 0:
+        return [a, 1.0, 1.0]
+    return [a, 1 / slope ** 2, -intercept / slope]
+
+@dataclass(frozen=True)
+class FitModel:
+    """
+    A fit function together with its parameter names, analytic Jacobian, bounds and initial-guess estimator.
+    """
+    name: str
+    function: object
+    parameter_names: tuple
+    jacobian: object = None
+    estimate_initial_guess: object = None
+    default_guess: tuple = None
+    bounds: tuple = (-np.inf, np.inf)
+    x_scale: object = 'jac'
+
+    def initial_guess(self, x=None, y=None):
+        """
+        Estimate starting parameters from the data, falling back to the default guess.
+        """
+        if x is not None and y is not None and self.estimate_initial_guess is not None:
+            x, y = _finite(x, y)
+            if len(x) >= len(self.parameter_names):
+                with np.errstate(all='ignore'):
+                    guess = np.asarray(self.estimate_initial_guess(x, y), dtype=float)
+                if np.all(np.isfinite(guess)):
+                    return _clip_to_bounds(guess, self.bounds)
+        return list(self.default_guess)
+
+MODELS = {}
+
+def register_model(name, function, parameter_names, jacobian=None, estimate_initial_guess=None, default_guess=None, bounds=(-np.inf, np.inf), x_scale='jac'):
+    """
+    Register a fit model under `name` so fit_data can find its Jacobian and initial-guess estimator.
+    """
+    if default_guess is None:
+        default_guess = (1.0, ) * len(parameter_names)
+    model = FitModel(name, function, tuple(parameter_names), jacobian, estimate_initial_guess, tuple(default_guess), bounds, x_scale)
+    MODELS[name] = model
+    return model
+
+register_model('Lorentzian', lorentzian, ['a', 'b', 'c', 'd'], lorentzian_jacobian, _lorentzian_guess,
+               default_guess=[-1, 0, 1, 0], bounds=([-np.inf, -np.inf, 0, -np.inf], np.inf))
+register_model('Arctan', arc_tan, ['a', 'b', 'c', 'd'], arc_tan_jacobian, _arc_tan_guess,
+               default_guess=[1, 1, 1, 0])
+register_model('Modified Lorentzian', modified_lorentzian, ['a', 'b', 'c', 'd'], modified_lorentzian_jacobian, _modified_lorentzian_guess,
+               default_guess=[-1, 0, 1, 0], bounds=([-np.inf, -np.inf, 0, -np.inf], np.inf))
+register_model('Gaussian', gaussian, ['a', 'b', 'c', 'd'], gaussian_jacobian, _gaussian_guess,
+               default_guess=[-1, 0, 1, 0], bounds=([-np.inf, -np.inf, 0, -np.inf], np.inf))
+register_model('Inverse Quadratic', inverse_quadratic, ['a', 'b', 'c'], inverse_quadratic_jacobian, _inverse_quadratic_guess,
+               default_guess=[0, 1, 1])
+
+def get_model(fit_name):
+    """
+    Return the registered model for a fit name or fit function.
+    """
+    if isinstance(fit_name, FitModel):
+        return fit_name
+    if fit_name in MODELS:
+        return MODELS[fit_name]
+    for model in MODELS.values():
+        if model.function is fit_name:
+            return model
+    raise ValueError(f"Unknown fit function: {fit_name}")
+
+def _clip_to_bounds(guess, bounds):
+    lower, upper = (np.broadcast_to(np.asarray(bound, dtype=float), guess.shape) for bound in bounds)
+    # least_squares needs a starting point strictly inside the bounds
+    span = np.where(np.isfinite(upper - lower), upper - lower, np.abs(guess) + 1)
+    margin = 1e-6 * span
+    return np.clip(guess, lower + margin, upper - margin)
+
+@instrumented
+def get_initial_guess(fit_name, x=None, y=None):
+    return get_model(fit_name).initial_guess(x, y)
+
+@instrumented
+def fit_model(x, y, fit_name, initial_guess=None, **least_squares_options):
+    """
+    Fit a registered model with its analytic Jacobian and return the full least_squares result.
+    Points where x or y is not finite, such as blank cells, are left out.
+    """
+    from scipy.optimize import least_squares
+    model = get_model(fit_name)
+    x, y = _finite(x, y)
+
     def residuals(params, x, y):
-        return y - fit_function(x, *params)
-    
-    if not initial_guess:
-        initial_guess = get_initial_guess(fit_name)
-    result = least_squares(residuals, initial_guess, args=(x, y))
-    return result.x
-    
+        return y - model.function(x, *params)
+
+    jacobian = '2-point'
+    if model.jacobian is not None:
+        def jacobian(params, x, y):
+            return -model.jacobian(x, *params)
+
+    if initial_guess is None:
+        initial_guess = model.initial_guess(x, y)
+    initial_guess = _clip_to_bounds(np.asarray(initial_guess, dtype=float), model.bounds)
+    options = {'jac': jacobian, 'bounds': model.bounds, 'x_scale': model.x_scale}
+    options.update(least_squares_options)
+    result = least_squares(residuals, initial_guess, args=(x, y), **options)
+    record(rows=len(x), nfev=result.nfev, njev=result.njev or 0)
+    return result
+
+@instrumented
+def fit_data(x, y, fit_name, fit_function=None, initial_guess=None):
+    if fit_function is not None and (fit_name not in MODELS or MODELS[fit_name].function is not fit_function):
+        # Unregistered functions are fit with finite differences
+        if initial_guess is None:
+            initial_guess = get_initial_guess(fit_name, x, y)
+        model = FitModel(fit_name, fit_function, (), x_scale=1.0)
+        return fit_model(x, y, model, initial_guess=initial_guess).x
+    return fit_model(x, y, fit_name, initial_guess=initial_guess).x
+
+@instrumented
 def equation_to_string(equation, params):
     """
     Convert an equation and its parameters to a string.
     """
-    print(*params)
     if equation is inverse_quadratic:
         omega_star = params[2]
         return rf"$|Z^*| = {params[0]:.3e} + \frac{{{params[1]:.3e}}}{{(\omega - \omega^*)^2}}$" + "\n" + rf"$\Omega^*$ = {omega_star / 1e3:.2f} kHz"
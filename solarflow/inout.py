@@ -1,27 +1,106 @@
-from collections import defaultdict
+import csv
+import re
 import numpy as np
 
-def read_csv_file(file_name, verbose=True, delimiter=',', start_line=0):
+from solarflow.profiling import instrumented, record
+
+@instrumented
+def read_header(file_name, delimiter=',', start_line=0):
     """
-    Read a csv file and return a list of lists.
+    Return the stripped column headers found on line `start_line` of a csv file.
     """
-    headers = []
-    data = defaultdict(list)
     with open(file_name, 'r') as f:
         for i, line in enumerate(f):
-            if i < start_line:
-                continue
-            elif i == start_line:
-                headers = line.strip().split(delimiter)
-                headers = [header.strip() for header in headers]
-            else:
-                for column, value in enumerate(line.strip().split(delimiter)):
-                    data[headers[column]].append(value)
+            if i == start_line:
+                return [header.strip() for header in line.strip().split(delimiter)]
+    raise ValueError(f"{file_name} has no header at line {start_line}")
+
+def _csv_options(delimiter):
+    """
+    Return pandas.read_csv options equivalent to splitting on `delimiter` and stripping blanks.
+    """
+    separator = delimiter.strip() or delimiter
+    if len(separator) == 1:
+        # Delimiters such as ', ' reduce to a single character plus leading whitespace,
+        # which the C parser handles without falling back to python.
+        return {'sep': separator, 'skipinitialspace': True, 'engine': 'c'}
+    return {'sep': re.escape(delimiter), 'engine': 'python'}
+
+def _read_options(headers, usecols, dtype, delimiter, skip_lines):
+    """
+    Return the pandas.read_csv options shared by whole-file and chunked reads.
+    """
+    return dict(header=None,
+                names=headers,
+                usecols=usecols,
+                skiprows=skip_lines,
+                dtype={header: dtype for header in usecols},
+                na_values=['', ' '],
+                keep_default_na=False,
+                skip_blank_lines=True,
+                quoting=csv.QUOTE_NONE,
+                **_csv_options(delimiter))
+
+@instrumented
+def parse_csv_columns(source, headers, columns=None, dtype=np.float64, delimiter=',', skip_lines=0, **read_options):
+    """
+    Parse delimited rows from a path or text buffer straight into typed numpy columns.
+    Blank cells are returned as NaN.
+    """
+    # pandas is imported on first use to keep `import solarflow` light
+    import pandas as pd
+    usecols = headers if columns is None else [header for header in headers if header in columns]
+    frame = pd.read_csv(source, **_read_options(headers, usecols, dtype, delimiter, skip_lines), **read_options)
+    record(rows=len(frame), columns=len(usecols))
+    return usecols, {header: frame[header].to_numpy(dtype=dtype) for header in usecols}
+
+@instrumented
+def read_csv_columns(file_name, columns=None, dtype=np.float64, delimiter=',', start_line=0, verbose=False):
+    """
+    Read a csv file into a dictionary of numpy columns without building per-value python objects.
+    Only `columns` are materialised when given; missing columns raise a KeyError.
+    """
+    headers = read_header(file_name, delimiter=delimiter, start_line=start_line)
+    if columns is not None:
+        missing = [column for column in columns if column not in headers]
+        if missing:
+            raise KeyError(f"Columns {missing} not found in {file_name}")
+    selected, data = parse_csv_columns(file_name, headers, columns=columns, dtype=dtype,
+                                       delimiter=delimiter, skip_lines=start_line + 1)
     if verbose:
-        print(f"Read {len(data)} lines from {file_name}")
-    for key in data.keys():
-        data[key] = np.array([float(value) if value != '' and value != ' ' else np.nan for value in data[key]])
-    return headers, data
+        num_rows = len(data[selected[0]]) if selected else 0
+        print(f"Read {num_rows} lines from {file_name}")
+    return selected, data
+
+def read_csv_chunks(file_name, columns=None, dtype=np.float64, delimiter=',', start_line=0, chunk_rows=1000000):
+    """
+    Yield dictionaries of numpy columns holding at most `chunk_rows` rows each, so files larger than memory
+    can be reduced chunk by chunk. Only `columns` are parsed when given; missing columns raise a KeyError.
+    """
+    import pandas as pd
+    headers = read_header(file_name, delimiter=delimiter, start_line=start_line)
+    if columns is not None:
+        missing = [column for column in columns if column not in headers]
+        if missing:
+            raise KeyError(f"Columns {missing} not found in {file_name}")
+    usecols = headers if columns is None else [header for header in headers if header in columns]
+    reader = pd.read_csv(file_name, chunksize=chunk_rows, **_read_options(headers, usecols, dtype, delimiter, start_line + 1))
+    with reader:
+        for frame in reader:
+            yield {header: frame[header].to_numpy(dtype=dtype) for header in usecols}
+
+@instrumented
+def read_csv_file(file_name, verbose=True, delimiter=',', start_line=0, columns=None, dtype=np.float64, cache=None):
+    """
+    Read a csv file and return its headers and a dictionary of numpy columns keyed by header.
+    Pass `cache` (True, a directory or a solarflow.cache.ParseCache) to reuse previously parsed columns.
+    """
+    if cache:
+        from solarflow.cache import read_csv_cached
+        return read_csv_cached(file_name, cache=cache, columns=columns, dtype=dtype, delimiter=delimiter,
+                               start_line=start_line, verbose=verbose)
+    return read_csv_columns(file_name, columns=columns, dtype=dtype, delimiter=delimiter,
+                            start_line=start_line, verbose=verbose)
 
 def to_filename(string):
-    return string.lower().replace(' ', '_')
\ No newline at end of file
+    return string.lower().replace(' ', '_')
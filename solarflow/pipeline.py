@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import pickle
+from collections import namedtuple
+import numpy as np
+
+from solarflow.cache import file_digest
+from solarflow.inout import read_csv_file
+from solarflow.data import build_frequency_index
+from solarflow.analysis import fit_circles_batched, extract_theta_by_frequency
+from solarflow.fit import fit_model, get_model
+from solarflow.batch import select_frequencies
+
+PIPELINE_VERSION = 3
+DEFAULT_PIPELINE_CACHE_DIR = os.environ.get('SOLARFLOW_PIPELINE_CACHE_DIR',
+                                            os.path.join(os.path.expanduser('~'), '.cache', 'solarflow', 'pipeline'))
+
+# A stage reads its parameters from the config section of the same name and receives its dependencies' outputs
+Stage = namedtuple('Stage', ['name', 'function', 'dependencies'])
+
+def _read_stage(params):
+    columns = [params['frequency_header'], params['real_header'], params['imaginary_header'], params['voltage_header']]
+    _, data = read_csv_file(params['file'], verbose=False, delimiter=params['delimiter'], start_line=params['start_line'], columns=columns)
+    return {header: np.asarray(values) for header, values in data.items()}
+
+def _group_stage(params, data):
+    index = build_frequency_index(data, params['frequency_header'])
+    return {
+        'frequencies': index.frequencies,
+        'real': index.by_frequency(params['real_header']),
+        'imaginary': index.by_frequency(params['imaginary_header']),
+        'voltage': index.by_frequency(params['voltage_header']),
+    }
+
+def _select_stage(params, grouped):
+    return select_frequencies(grouped['frequencies'], params.get('frequencies'))
+
+def _circles_stage(params, grouped, selected_frequencies):
+    return fit_circles_batched(selected_frequencies, grouped['real'], grouped['imaginary'],
+                               method=params.get('method', 'taubin'), refine=params.get('refine', True))
+
+def _theta_stage(params, grouped, selected_frequencies, circles):
+    circle_fits, _ = circles
+    return extract_theta_by_frequency(selected_frequencies, grouped['real'], grouped['imaginary'], circle_fits)
+
+def _radius_fit_stage(params, selected_frequencies, circles):
+    if not params.get('model'):
+        return None
+    circle_fits, _ = circles
+    model = get_model(params['model'])
+    radii = np.array([circle_fits[frequency][2] for frequency in selected_frequencies])
+    result = fit_model(selected_frequencies, radii, model)
+    return {'model': model.name, 'params': result.x, 'cost': result.cost, 'nfev': result.nfev}
+
+def _theta_fit_stage(params, grouped, selected_frequencies, theta_data):
+    if not params.get('models'):
+        return None
+    from solarflow.sweep import fit_model_sweep
+    return fit_model_sweep(selected_frequencies, grouped['voltage'], theta_data, params['models'],
+                           voltage_cutoff=params.get('voltage_cutoff'), split=params.get('split', 'segments'),
+                           tolerance=params.get('tolerance'), workers=params.get('workers', 1))
+
+def _plots_stage(params, grouped, selected_frequencies, circles, theta_data, radius_fit):
+    if not params.get('output_dir'):
+        return []
+    from solarflow.export import FigureJob, render_figures
+    from solarflow.plot import plot_impedance_by_frequency, plot_circle_fit, plot_theta_vs_voltage, plot_omega_vs_radius, plot_fit
+    circle_fits, _ = circles
+    figures = params.get('figures', ['circle_fits', 'theta_vs_voltage', 'radius_vs_omega'])
+    samples = {key: params[key] for key in ('max_points', 'decimation', 'rasterized') if key in params}
+    calls = {
+        'circle_fits': [(plot_impedance_by_frequency, (selected_frequencies, grouped['real'], grouped['imaginary']), samples),
+                        (plot_circle_fit, (circle_fits, ), {'plot_centers': True})],
+        'theta_vs_voltage': [(plot_theta_vs_voltage, (selected_frequencies, theta_data, grouped['voltage']), samples)],
+        'radius_vs_omega': [(plot_omega_vs_radius, (selected_frequencies, circle_fits), {'x_scale': 1e3})],
+    }
+    if radius_fit is not None:
+        model = get_model(radius_fit['model'])
+        calls['radius_vs_omega'].append((plot_fit, (), {'x': selected_frequencies, 'params': radius_fit['params'], 'func_name': model.name,
+                                                        'func': model.function, 'color': 'b', 'x_scale': 1e3}))
+    jobs = [FigureJob(os.path.join(params['output_dir'], f"{name}.png"), calls[name], dpi=params.get('dpi', 500)) for name in figures]
+    return render_figures(jobs, workers=params.get('workers', 1))
+
+STAGES = [
+    Stage('read', _read_stage, ()),
+    Stage('group', _group_stage, ('read', )),
+    Stage('select', _select_stage, ('group', )),
+    Stage('circles', _circles_stage, ('group', 'select')),
+    Stage('theta', _theta_stage, ('group', 'select', 'circles')),
+    Stage('radius_fit', _radius_fit_stage, ('select', 'circles')),
+    Stage('theta_fit', _theta_fit_stage, ('group', 'select', 'theta')),
+    Stage('plots', _plots_stage, ('group', 'select', 'circles', 'theta', 'radius_fit')),
+]
+
+INPUT_DEFAULTS = {
+    'delimiter': ',',
+    'start_line': 3,
+    'frequency_header': 'Frequency (Hz)',
+    'real_header': "Z' (Ohm)",
+    'imaginary_header': "Z'' (Ohm)",
+    'voltage_header': 'Voltage (V)',
+}
+
+def load_config(config_path):
+    """
+    Load a pipeline config from TOML, YAML or JSON, resolving input and output paths against the config file.
+    """
+    extension = os.path.splitext(config_path)[1].lower()
+    if extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib
+        with open(config_path, 'rb') as f:
+            config = tomllib.load(f)
+    elif extension in ('.yaml', '.yml'):
+        import yaml
+        with open(config_path, 'r') as f:
+            config = yaml.safe_load(f)
+    elif extension == '.json':
+        with open(config_path, 'r') as f:
+            config = json.load(f)
+    else:
+        raise ValueError(f"Unsupported pipeline config format: {config_path}")
+
+    base_dir = os.path.dirname(os.path.abspath(config_path))
+    config['input'] = dict(INPUT_DEFAULTS, **config.get('input', {}))
+    config['input']['file'] = os.path.join(base_dir, os.path.expanduser(config['input']['file']))
+    if config.get('plots', {}).get('output_dir'):
+        config['plots']['output_dir'] = os.path.join(base_dir, os.path.expanduser(config['plots']['output_dir']))
+    if config.get('cache', {}).get('directory'):
+        config['cache']['directory'] = os.path.join(base_dir, os.path.expanduser(config['cache']['directory']))
+    return config
+
+def _stage_params(config, stage):
+    # The read and group stages both take the [input] section
+    section = 'input' if stage.name in ('read', 'group') else stage.name
+    return config.get(section, {})
+
+def _digest(value):
+    return hashlib.sha256(value).hexdigest()
+
+class PipelineRun:
+    """
+    Memoized execution of the pipeline stages. Every stage is keyed by a hash of its parameters and the
+    content digests of its dependencies' outputs, so only stages downstream of a change are recomputed.
+    """
+    def __init__(self, config, cache_dir=None, stages=STAGES, verbose=True):
+        self.config = config
+        self.cache_dir = cache_dir or config.get('cache', {}).get('directory') or DEFAULT_PIPELINE_CACHE_DIR
+        self.stages = {stage.name: stage for stage in stages}
+        self.verbose = verbose
+        self.keys = {}
+        self.digests = {}
+        self.executed = []
+        self.reused = []
+        self._outputs = {}
+
+    def _paths(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl"), os.path.join(self.cache_dir, f"{key}.digest")
+
+    def stage_key(self, stage):
+        params = dict(_stage_params(self.config, stage))
+        if stage.name == 'read':
+            params['source_digest'] = file_digest(params['file'])
+        description = {
+            'stage': stage.name,
+            'version': PIPELINE_VERSION,
+            'params': params,
+            'dependencies': [self.digests[dependency] for dependency in stage.dependencies],
+        }
+        return _digest(json.dumps(description, sort_keys=True, default=str).encode())
+
+    def _is_reusable(self, stage, key):
+        output_path, digest_path = self._paths(key)
+        if not (os.path.exists(output_path) and os.path.exists(digest_path)):
+            return False
+        if stage.name == 'plots':
+            # Figures are side effects, so rerender them if any were deleted
+            return all(os.path.exists(path) for path in self.get('plots', key=key))
+        return True
+
+    def get(self, name, key=None):
+        """
+        Return a stage's output, loading it from the memo store if it was not computed in this run.
+        """
+        if name not in self._outputs:
+            with open(self._paths(key or self.keys[name])[0], 'rb') as f:
+                self._outputs[name] = pickle.load(f)
+        return self._outputs[name]
+
+    def run(self, force=()):
+        """
+        Run every stage in order, reusing memoized outputs except for stages named in `force`. Return self.
+        """
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for stage in self.stages.values():
+            key = self.stage_key(stage)
+            self.keys[stage.name] = key
+            output_path, digest_path = self._paths(key)
+            if stage.name not in force and self._is_reusable(stage, key):
+                with open(digest_path, 'r') as f:
+                    self.digests[stage.name] = f.read().strip()
+                self.reused.append(stage.name)
+                continue
+
+            output = stage.function(_stage_params(self.config, stage), *[self.get(dependency) for dependency in stage.dependencies])
+            payload = pickle.dumps(output, protocol=pickle.HIGHEST_PROTOCOL)
+            self.digests[stage.name] = _digest(payload)
+            staging_path = f"{output_path}.{os.getpid()}.tmp"
+            with open(staging_path, 'wb') as f:
+                f.write(payload)
+            os.replace(staging_path, output_path)
+            with open(digest_path, 'w') as f:
+                f.write(self.digests[stage.name])
+            self._outputs[stage.name] = output
+            self.executed.append(stage.name)
+        if self.verbose:
+            print(f"Executed: {', '.join(self.executed) or 'nothing'}; reused: {', '.join(self.reused) or 'nothing'}")
+        return self
+
+def run_pipeline(config, cache_dir=None, force=(), verbose=True):
+    """
+    Run a pipeline config (a dictionary or a path to a TOML/YAML/JSON file) and return the PipelineRun.
+    """
+    if isinstance(config, (str, os.PathLike)):
+        config = load_config(os.fspath(config))
+    return PipelineRun(config, cache_dir=cache_dir, verbose=verbose).run(force=force)
@@ -1,44 +1,64 @@
 import numpy as np
-from matplotlib import pyplot as plt
+import matplotlib
+from cycler import cycler
+from matplotlib.collections import PatchCollection
+from matplotlib.patches import Circle
 from matplotlib.ticker import FuncFormatter
 from solarflow.fit import lorentzian
 from solarflow.fit import equation_to_string
+from solarflow.decimate import decimate_by_frequency
+from solarflow.profiling import instrumented
 
 def get_color_cycler():
     """
     Return a color cycler.
     """
     color_list = ['#007BA7', '#9B111e', '#009E60', '#FA8072']
-    return plt.cycler(color=color_list)
+    return cycler(color=color_list)
 
-def set_plotting_defaults(single_color=False):
-    plt.rcParams['lines.linewidth'] = 2.2
-    plt.rcParams["xtick.major.size"] = 5
-    plt.rcParams["xtick.major.width"] = 1.2
-    plt.rcParams["ytick.major.size"] = 5
-    plt.rcParams["ytick.major.width"] = 1.2
-    plt.rcParams["axes.titlesize"] = 20
-    plt.rcParams["font.size"] = 10
-    plt.rcParams['xtick.labelsize'] = 15
-    plt.rcParams['ytick.labelsize'] = 15
-    color_list = ['#007BA7', '#9B111e', '#009E60', '#FA8072']
-    if single_color:
-        color_list = ['#007BA7', ]
-    plt.rcParams['axes.prop_cycle'] = get_color_cycler()
-    plt.gca().invert_yaxis()
+def plotting_defaults():
+    """
+    Return the rcParams used for every solarflow figure.
+    """
+    return {
+        'lines.linewidth': 2.2,
+        'xtick.major.size': 5,
+        'xtick.major.width': 1.2,
+        'ytick.major.size': 5,
+        'ytick.major.width': 1.2,
+        'axes.titlesize': 20,
+        'font.size': 10,
+        'xtick.labelsize': 15,
+        'ytick.labelsize': 15,
+        'axes.prop_cycle': get_color_cycler(),
+    }
+
+@instrumented
+def set_plotting_defaults(single_color=False, axis=None):
+    matplotlib.rcParams.update(plotting_defaults())
+    # Only invert an axis that was asked for, rather than creating a stray figure through pyplot
+    if axis is not None:
+        axis.invert_yaxis()
 
 def ohms_to_kOhms(x, pos):
     return f'{x / 1000:.0f}'
 
-def plot_impedance_by_frequency(frequencies, impedance_data_real, impedance_data_im, axis, add_to_legend=True):
+@instrumented
+def plot_impedance_by_frequency(frequencies, impedance_data_real, impedance_data_im, axis, add_to_legend=True,
+                                max_points=None, decimation='minmax', rasterized=False):
     """
     Plot impedance data by frequency.
+    With `max_points`, dense frequencies are decimated first (see decimate.decimate_by_frequency);
+    `rasterized` draws the markers as an image inside vector output.
     """
+    if max_points is not None:
+        impedance_data_real, impedance_data_im = decimate_by_frequency(frequencies, impedance_data_real, impedance_data_im,
+                                                                       max_points=max_points, method=decimation)
     axis.axis('equal')
     axis.set_prop_cycle(get_color_cycler())
     for frequency in frequencies:
         label = f"{int(frequency // 1e3)} kHz" if add_to_legend else None
-        axis.plot(impedance_data_real[frequency], impedance_data_im[frequency], '.', label=label)
+        axis.plot(impedance_data_real[frequency], impedance_data_im[frequency], '.', label=label, rasterized=rasterized)
     axis.title.set_text("Impedance Response by Frequency")
     formatter = FuncFormatter(ohms_to_kOhms)
     axis.xaxis.set_major_formatter(formatter)
@@ -48,34 +68,37 @@ def plot_impedance_by_frequency(frequencies, impedance_data_real, impedance_data
     if add_to_legend:
         axis.legend(loc='lower right')
 
+@instrumented
 def plot_circle_fit(circle_fits, axis, plot_centers = False):
     """
     Plot circle fit.
     """
     axis.set_prop_cycle(get_color_cycler())
     axis.axis('equal')
-    for frequency, (xc, yc, r) in circle_fits.items():
-        circle = plt.Circle((xc, yc), r, color='#36454F', fill=False)
-        axis.add_artist(circle)
-        if plot_centers:
+    # Draw every circle as one collection and autoscale once
+    circles = [Circle((xc, yc), r) for xc, yc, r in circle_fits.values()]
+    axis.add_collection(PatchCollection(circles, edgecolor='#36454F', facecolor='none'), autolim=True)
+    if plot_centers:
+        for xc, yc, _ in circle_fits.values():
             axis.plot(xc, yc, marker = '*')
+    axis.autoscale_view()
 
-        # Recompute limits and autoscale
-        axis.relim()
-        axis.autoscale_view()
-
-def plot_theta_vs_voltage(frequencies, theta_data, voltage_data, axis):
+@instrumented
+def plot_theta_vs_voltage(frequencies, theta_data, voltage_data, axis, max_points=None, decimation='minmax', rasterized=False):
     """
-    Plot theta vs voltage.
+    Plot theta vs voltage, optionally decimated to `max_points` per frequency and rasterized.
     """
+    if max_points is not None:
+        voltage_data, theta_data = decimate_by_frequency(frequencies, voltage_data, theta_data, max_points=max_points, method=decimation)
     axis.set_prop_cycle(get_color_cycler())
     for frequency in frequencies:
-        axis.plot(voltage_data[frequency], theta_data[frequency], '.', label=f"{int(frequency // 1e3)} kHz")
+        axis.plot(voltage_data[frequency], theta_data[frequency], '.', label=f"{int(frequency // 1e3)} kHz", rasterized=rasterized)
     axis.title.set_text(r"Angle $\Theta$ Relative to Center vs. Voltage")
     axis.set_xlabel("Voltage (V)", fontsize=18)
     axis.set_ylabel(r"$\Theta$ (rad)", fontsize=18)
     axis.legend(loc='lower right')
 
+@instrumented
 def plot_omega_vs_radius(frequencies, circle_fits, axis, x_scale=1e3, y_scale=1):
     r = np.array([circle_fits[freq][2] for freq in frequencies])
     axis.plot(np.array(frequencies) / x_scale, r / y_scale, 'o', color='#9B111e')
@@ -83,10 +106,11 @@ def plot_omega_vs_radius(frequencies, circle_fits, axis, x_scale=1e3, y_scale=1)
     axis.set_xlabel("Frequency (kHz)", fontsize=18)
     axis.set_ylabel("Radius (Ohm)", fontsize=18)
 
+@instrumented
 def plot_fit(axis, x, params, func_name, func, color='r', num_points = 1000, show_legend=True, x_scale = 1, y_scale = 1):
     x = np.linspace(min(x), max(x), num_points)
     y_fit = func(x, *params)
     label = f'{func_name} Fit' + '\n' + equation_to_string(func, params)
-    axis.plot(x / x_scale, y_fit / y_scale, 'r-', label=label, color=color)
+    axis.plot(x / x_scale, y_fit / y_scale, '-', label=label, color=color)
     if show_legend:
         axis.legend()
\ No newline at end of file
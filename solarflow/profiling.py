@@ -0,0 +1,155 @@
+import cProfile
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# The active ProfileSession, or None. Instrumented functions only check this when profiling is off.
+_session = None
+
+def instrumented(function):
+    """
+    Record wall time, call counts, counters and peak memory of `function` while a profile session is active.
+    """
+    name = f"{function.__module__.rsplit('.', 1)[-1]}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _session is None:
+            return function(*args, **kwargs)
+        return _session.call(name, function, args, kwargs)
+    return wrapper
+
+def record(**counters):
+    """
+    Add counters such as rows, frequencies or nfev to the innermost instrumented call.
+    """
+    if _session is not None:
+        _session.record(counters)
+
+class _Frame:
+    __slots__ = ('name', 'counters', 'memory_start', 'memory_peak')
+
+    def __init__(self, name):
+        self.name = name
+        self.counters = {}
+        self.memory_start = self.memory_peak = 0
+
+class ProfileSession:
+    """
+    Per-function statistics and trace events collected between profile() entry and exit.
+    """
+    def __init__(self, memory=False, trace=False):
+        self.memory = memory
+        self.trace = trace
+        self.stats = {}
+        self.events = []
+        self.started = time.time()
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def call(self, name, function, args, kwargs):
+        stack = self._stack()
+        frame = _Frame(name)
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].memory_peak = max(stack[-1].memory_peak, peak)
+            tracemalloc.reset_peak()
+            frame.memory_start = frame.memory_peak = current
+        stack.append(frame)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            stack.pop()
+            peak_bytes = None
+            if self.memory:
+                _, peak = tracemalloc.get_traced_memory()
+                frame.memory_peak = max(frame.memory_peak, peak)
+                peak_bytes = frame.memory_peak - frame.memory_start
+                if stack:
+                    stack[-1].memory_peak = max(stack[-1].memory_peak, frame.memory_peak)
+                tracemalloc.reset_peak()
+            self._finish(frame, start, duration, peak_bytes)
+
+    def _finish(self, frame, start, duration, peak_bytes):
+        with self._lock:
+            stats = self.stats.setdefault(frame.name, {'calls': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'counters': {}})
+            stats['calls'] += 1
+            stats['total_seconds'] += duration
+            stats['max_seconds'] = max(stats['max_seconds'], duration)
+            for key, value in frame.counters.items():
+                stats['counters'][key] = stats['counters'].get(key, 0) + value
+            if peak_bytes is not None:
+                stats['peak_bytes'] = max(stats.get('peak_bytes', 0), peak_bytes)
+            if self.trace:
+                self.events.append({'name': frame.name, 'ph': 'X', 'pid': os.getpid(), 'tid': threading.get_ident(),
+                                    'ts': (start - self._origin) * 1e6, 'dur': duration * 1e6, 'args': dict(frame.counters)})
+
+    def record(self, counters):
+        stack = self._stack()
+        if stack:
+            frame_counters = stack[-1].counters
+            for key, value in counters.items():
+                frame_counters[key] = frame_counters.get(key, 0) + value
+
+    def report(self):
+        """
+        Return the per-function statistics as a JSON-serialisable dictionary, slowest first.
+        """
+        functions = dict(sorted(self.stats.items(), key=lambda item: -item[1]['total_seconds']))
+        return {'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started)),
+                'wall_seconds': time.perf_counter() - self._origin,
+                'functions': functions}
+
+    def write_report(self, file_name):
+        with open(file_name, 'w') as f:
+            json.dump(self.report(), f, indent=2, default=float)
+
+    def write_trace(self, file_name):
+        """
+        Write the calls as Chrome trace events, viewable in chrome://tracing or Perfetto.
+        """
+        with open(file_name, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f, default=float)
+
+@contextmanager
+def profile(report_path=None, trace_path=None, memory=False, cprofile_path=None):
+    """
+    Profile every instrumented solarflow call made inside the block.
+    Writes a JSON report, Chrome trace events and cProfile stats to whichever paths are given.
+    Work done in other processes (e.g. batch workers) is not captured.
+    """
+    global _session
+    session = ProfileSession(memory=memory, trace=trace_path is not None)
+    previous_session, _session = _session, session
+    started_tracing = memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile() if cprofile_path else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield session
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_path)
+        if started_tracing:
+            tracemalloc.stop()
+        _session = previous_session
+        if report_path:
+            session.write_report(report_path)
+        if trace_path:
+            session.write_trace(trace_path)
@@ -1,3 +1 @@
 """Import local modules"""
-from . import losses
-from . import optimization
\ No newline at end of file
@@ -0,0 +1,191 @@
+import json
+import numbers
+import os
+import sqlite3
+import time
+import numpy as np
+
+from solarflow.profiling import instrumented, record
+
+SCHEMA_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created TEXT NOT NULL,
+    solarflow_version TEXT,
+    description TEXT,
+    options TEXT
+);
+CREATE TABLE IF NOT EXISTS sources (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    device TEXT NOT NULL,
+    date TEXT,
+    file TEXT,
+    file_digest TEXT,
+    status TEXT,
+    error TEXT,
+    options TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    device TEXT NOT NULL,
+    date TEXT,
+    frequency REAL,
+    model TEXT NOT NULL DEFAULT '',
+    quantity TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS results_by_quantity ON results (quantity, device, date, frequency);
+CREATE INDEX IF NOT EXISTS results_by_device ON results (device, run_id);
+CREATE INDEX IF NOT EXISTS sources_by_device ON sources (device, date);
+"""
+
+# Batch result columns that describe rather than measure, and the summary key naming each prefix's model
+_LABEL_COLUMNS = {'device', 'frequency', 'file', 'status', 'error', 'traceback', 'date',
+                  'circle_method', 'theta_model', 'radius_model', 'circuit'}
+_MODEL_KEYS = (('theta_', 'theta_model'), ('radius_', 'radius_model'), ('circuit_', 'circuit'))
+
+def _model_for(quantity, labels):
+    for prefix, key in _MODEL_KEYS:
+        if quantity.startswith(prefix):
+            return labels.get(key) or ''
+    return labels.get('circle_method') or ''
+
+def _numeric(value):
+    if isinstance(value, (bool, np.bool_)):
+        return float(value)
+    if isinstance(value, numbers.Real):
+        return float(value)
+    return None
+
+def batch_records(rows, summaries):
+    """
+    Return (device, date, frequency, model, quantity, value) records for the per-frequency rows and the
+    per-device summaries of a batch run. Device-level quantities have no frequency; non-numeric fields are skipped.
+    """
+    summaries_by_device = {summary['device']: summary for summary in summaries}
+    records = []
+    entries = [(row, dict(summaries_by_device.get(row['device'], {}), **row), row['frequency']) for row in rows]
+    entries += [(summary, summary, None) for summary in summaries if summary.get('status') == 'ok']
+    for values, labels, frequency in entries:
+        for quantity, value in values.items():
+            value = _numeric(value) if quantity not in _LABEL_COLUMNS else None
+            if value is not None:
+                records.append((str(labels['device']), labels.get('date'), frequency, _model_for(quantity, labels), quantity, value))
+    return records
+
+class ResultsStore:
+    """
+    A local SQLite store of fit results in long format, one value per (run, device, date, frequency, model,
+    quantity), with per-run and per-device provenance. Queries return pandas DataFrames or numpy arrays.
+    """
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(_SCHEMA)
+        self.connection.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def start_run(self, description=None, options=None):
+        """
+        Record a new run and return its run_id.
+        """
+        from solarflow import __version__
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (created, solarflow_version, description, options) VALUES (?, ?, ?, ?)',
+                (time.strftime('%Y-%m-%dT%H:%M:%S'), __version__, description, json.dumps(options, default=str)))
+        return cursor.lastrowid
+
+    @instrumented
+    def add_results(self, run_id, records):
+        """
+        Bulk insert (device, date, frequency, model, quantity, value) records for `run_id`.
+        """
+        records = list(records)
+        with self.connection:
+            self.connection.executemany(
+                'INSERT INTO results (run_id, device, date, frequency, model, quantity, value) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                [(run_id, ) + tuple(entry) for entry in records])
+        record(rows=len(records))
+        return len(records)
+
+    def add_sources(self, run_id, devices, summaries):
+        """
+        Record where every device's data came from and whether it was analysed.
+        """
+        from solarflow.cache import file_digest
+        summaries_by_device = {summary['device']: summary for summary in summaries}
+        sources = []
+        for options in devices:
+            summary = summaries_by_device.get(options['key'], {})
+            digest = file_digest(options['file']) if os.path.exists(options['file']) else None
+            sources.append((run_id, str(options['key']), summary.get('date', options.get('date')), options['file'], digest,
+                            summary.get('status'), summary.get('error'), json.dumps(options, default=str)))
+        with self.connection:
+            self.connection.executemany('INSERT INTO sources VALUES (?, ?, ?, ?, ?, ?, ?, ?)', sources)
+
+    def add_batch(self, devices, rows, summaries, description=None):
+        """
+        Store the output of batch.run_batch as a new run and return its run_id.
+        """
+        run_id = self.start_run(description=description, options={'devices': [options['key'] for options in devices]})
+        self.add_sources(run_id, devices, summaries)
+        self.add_results(run_id, batch_records(rows, summaries))
+        return run_id
+
+    @instrumented
+    def query(self, quantity=None, device=None, model=None, date_from=None, date_to=None, frequency=None, latest=True):
+        """
+        Return matching results as a DataFrame ordered by device, date and frequency.
+        `device` is a glob such as 'R_*'; dates are ISO strings and the range includes both ends.
+        With `latest`, only the most recent run that stored each quantity for each device and date among the
+        matching results is returned, so newer measurements of a device do not hide older dates.
+        """
+        import pandas as pd
+        conditions, parameters = [], []
+        for column, operator, value in (('quantity', '=', quantity), ('device', 'GLOB', device), ('model', '=', model),
+                                        ('date', '>=', date_from), ('date', '<=', date_to), ('frequency', '=', frequency)):
+            if value is not None:
+                conditions.append(f"{{table}}.{column} {operator} ?")
+                parameters.append(value)
+        if latest:
+            # The same filters apply inside, so the latest run is chosen among the results that match
+            latest_conditions = [condition.format(table='l') for condition in conditions]
+            parameters += parameters
+            conditions.append('r.run_id = (SELECT MAX(l.run_id) FROM results l WHERE l.device = r.device AND l.quantity = r.quantity '
+                              f"AND l.date IS r.date{''.join(' AND ' + condition for condition in latest_conditions)})")
+        conditions = [condition.format(table='r') for condition in conditions]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        table = pd.read_sql_query(f"SELECT r.run_id, r.device, r.date, r.frequency, r.model, r.quantity, r.value FROM results r "
+                                  f"{where} ORDER BY r.device, r.date, r.frequency", self.connection, params=parameters)
+        record(rows=len(table))
+        return table
+
+    def arrays(self, quantity, device=None, **filters):
+        """
+        Return {device: (frequencies, values)} numpy arrays of one per-frequency quantity, e.g. arrays('r', 'R_*').
+        """
+        table = self.query(quantity=quantity, device=device, **filters)
+        table = table[table['frequency'].notna()]
+        return {name: (group['frequency'].to_numpy(), group['value'].to_numpy()) for name, group in table.groupby('device', sort=True)}
+
+    def runs(self):
+        """
+        Return the runs table as a DataFrame.
+        """
+        import pandas as pd
+        return pd.read_sql_query('SELECT * FROM runs ORDER BY run_id', self.connection)
@@ -0,0 +1,152 @@
+import io
+import os
+import time
+from collections import namedtuple
+import numpy as np
+
+from solarflow.inout import parse_csv_columns
+from solarflow.data import FrequencyIndex
+from solarflow.analysis import circle_scatter, solve_circle_scatter
+
+# `restarted` is True for the first update after the file was truncated or replaced and fitting started over
+StreamUpdate = namedtuple('StreamUpdate', ['rows', 'circle_fits', 'theta', 'voltage', 'restarted'], defaults=(False, ))
+
+class CsvTail:
+    """
+    Follow a csv file that is still being written, parsing only complete lines appended since the last read.
+    `generation` counts how often the file was truncated or replaced and reading started over from its top.
+    """
+    def __init__(self, file_name, delimiter=',', start_line=0, columns=None, dtype=np.float64):
+        self.file_name = file_name
+        self.delimiter = delimiter
+        self.start_line = start_line
+        self.columns = columns
+        self.dtype = dtype
+        self.generation = 0
+        self.reset()
+
+    def reset(self):
+        self.offset = 0
+        self.headers = None
+        self._lines_seen = 0
+        self._partial = b''
+
+    def read_new(self):
+        """
+        Return {header: values} for the rows appended since the previous call, or None if there are none.
+        """
+        if not os.path.exists(self.file_name):
+            return None
+        if os.path.getsize(self.file_name) < self.offset:
+            # The file was truncated or replaced, so start over
+            self.reset()
+            self.generation += 1
+        with open(self.file_name, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read()
+        self.offset += len(chunk)
+        buffer = self._partial + chunk
+        complete_end = buffer.rfind(b'\n') + 1
+        self._partial = buffer[complete_end:]
+        text = buffer[:complete_end].decode()
+        if not text:
+            return None
+
+        if self.headers is None:
+            lines = text.splitlines(keepends=True)
+            header_idx = self.start_line - self._lines_seen
+            self._lines_seen += len(lines)
+            if header_idx >= len(lines):
+                return None
+            self.headers = [header.strip() for header in lines[header_idx].strip().split(self.delimiter)]
+            text = ''.join(lines[header_idx + 1:])
+            if not text.strip():
+                return None
+
+        _, data = parse_csv_columns(io.StringIO(text), self.headers, columns=self.columns, dtype=self.dtype, delimiter=self.delimiter)
+        return data
+
+class CircleAccumulator:
+    """
+    Running circle-fit sufficient statistics per frequency.
+    Each update only touches the new points; fits are re-solved from the accumulated scatter matrices.
+    """
+    def __init__(self, method='kasa'):
+        self.method = method
+        self.frequencies = []
+        self._positions = {}
+        self.scatter = np.zeros((0, 4, 4))
+        # Points are accumulated relative to the first point seen at each frequency to limit cancellation
+        self.origin = np.zeros((0, 2))
+
+    def update(self, frequencies, x, y):
+        """
+        Add points measured at `frequencies` and return the frequencies whose fits changed.
+        """
+        frequencies, x, y = np.asarray(frequencies, dtype=float), np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+        valid = np.isfinite(frequencies) & (frequencies != 0) & np.isfinite(x) & np.isfinite(y)
+        frequencies, x, y = frequencies[valid], x[valid], y[valid]
+        batch_frequencies, first_idx, batch_ids = np.unique(frequencies, return_index=True, return_inverse=True)
+        for frequency, point_idx in zip(batch_frequencies, first_idx):
+            if frequency not in self._positions:
+                self._positions[frequency] = len(self.frequencies)
+                self.frequencies.append(frequency)
+                self.scatter = np.concatenate([self.scatter, np.zeros((1, 4, 4))])
+                self.origin = np.concatenate([self.origin, [[x[point_idx], y[point_idx]]]])
+        positions = np.array([self._positions[frequency] for frequency in batch_frequencies], dtype=np.intp)
+        group_ids = positions[batch_ids]
+        self.scatter += circle_scatter(x, y, group_ids, len(self.frequencies), self.origin)
+        return list(batch_frequencies)
+
+    def fits(self, frequencies=None):
+        """
+        Return {frequency: (xc, yc, r)} from the statistics accumulated so far.
+        """
+        frequencies = self.frequencies if frequencies is None else frequencies
+        positions = np.array([self._positions[frequency] for frequency in frequencies], dtype=np.intp)
+        xc, yc, r = solve_circle_scatter(self.scatter[positions], self.origin[positions], method=self.method)
+        return {frequency: (xc[i], yc[i], r[i]) for i, frequency in enumerate(frequencies)}
+
+def stream_circle_fits(file_name, delimiter=',', start_line=0, frequency_header='Frequency (Hz)', real_header="Z' (Ohm)",
+                       imaginary_header="Z'' (Ohm)", voltage_header='Voltage (V)', method='kasa', poll_interval=1.0,
+                       idle_timeout=None, callback=None):
+    """
+    Tail a growing sweep file and yield a StreamUpdate for every batch of appended rows, holding the updated
+    (xc, yc, r) of each frequency in the batch and the theta and voltage of the new points.
+    Stops after `idle_timeout` seconds without new rows (never when None, after the first empty poll when 0).
+    When the file is truncated or replaced, as when the instrument starts a new sweep in it, the accumulated
+    fits are discarded and the next update is marked `restarted`.
+    `callback`, when given, is called with every update as well.
+    """
+    columns = [frequency_header, real_header, imaginary_header] + ([voltage_header] if voltage_header else [])
+    tail = CsvTail(file_name, delimiter=delimiter, start_line=start_line, columns=columns)
+    accumulator = CircleAccumulator(method=method)
+    generation, restarted = tail.generation, False
+    last_update = time.monotonic()
+    while True:
+        batch = tail.read_new()
+        if tail.generation != generation:
+            # Points of the previous sweep must not leak into the new one's fits
+            accumulator = CircleAccumulator(method=method)
+            generation, restarted = tail.generation, True
+        if batch is None or len(batch[frequency_header]) == 0:
+            if idle_timeout is not None and time.monotonic() - last_update >= idle_timeout:
+                return
+            time.sleep(poll_interval)
+            continue
+        last_update = time.monotonic()
+
+        accumulator.update(batch[frequency_header], batch[real_header], batch[imaginary_header])
+        index = FrequencyIndex(batch, frequency_header)
+        circle_fits = accumulator.fits(list(index.frequencies))
+        theta, voltage = {}, {}
+        for frequency in index.frequencies:
+            xc, yc, _ = circle_fits[frequency]
+            theta[frequency] = np.arctan2(index.values(imaginary_header, frequency) - yc, index.values(real_header, frequency) - xc)
+            if voltage_header:
+                voltage[frequency] = index.values(voltage_header, frequency)
+        update = StreamUpdate(len(batch[frequency_header]), circle_fits, theta, voltage, restarted)
+        restarted = False
+        if callback is not None:
+            callback(update)
+        yield update
@@ -0,0 +1,180 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from solarflow.analysis import halve_data, segment_sweeps
+from solarflow.continuation import fit_in_sequence
+from solarflow.fit import fit_model, get_model
+
+def information_criteria(rss, num_points, num_params):
+    """
+    Return (AIC, BIC) of a least-squares fit with Gaussian residuals.
+    """
+    if num_points == 0 or rss <= 0:
+        return np.nan, np.nan
+    log_likelihood_term = num_points * np.log(rss / num_points)
+    return log_likelihood_term + 2 * num_params, log_likelihood_term + num_params * np.log(num_points)
+
+def split_sweep(voltage, theta, split='segments', tolerance=None):
+    """
+    Return [(branch, voltage, theta)] for one frequency: the whole sweep (split=None), every monotonic
+    branch between voltage turning points (split='segments') or the two halves of a single cycle.
+    """
+    if split is None:
+        return [(0, voltage, theta)]
+    elif split == 'segments':
+        branches = segment_sweeps([0], {0: voltage}, tolerance=tolerance)
+        return [(branch, voltage[start:stop], theta[start:stop]) for branch, (start, stop) in enumerate(zip(branches.start, branches.stop))]
+    elif split == 'halves':
+        return [(branch, voltage_subset, theta_subset) for branch, (voltage_subset, theta_subset) in enumerate(halve_data([voltage, theta]))]
+    else:
+        raise ValueError(f"Unknown sweep split: {split}")
+
+def _result_row(frequency, branch, model, x, result=None, error=None):
+    direction = int(np.sign(x[-1] - x[0])) if len(x) > 1 else 0
+    row = {'frequency': frequency, 'branch': branch, 'direction': direction, 'model': model.name, 'n_points': len(x)}
+    if result is None:
+        row.update({'success': False, 'message': error or 'too few points'})
+        return row
+    rss = 2 * result.cost
+    aic, bic = information_criteria(rss, len(x), len(model.parameter_names))
+    row.update({name: value for name, value in zip(model.parameter_names, result.x)})
+    row.update({
+        'params': tuple(result.x),
+        'rss': rss,
+        'residual_norm': np.sqrt(rss),
+        'aic': aic,
+        'bic': bic,
+        'nfev': result.nfev,
+        'success': bool(result.success),
+        'message': result.message,
+    })
+    return row
+
+def _fit_task(task):
+    frequency, branch, fit_name, x, y = task
+    model = get_model(fit_name)
+    if len(x) < len(model.parameter_names):
+        return _result_row(frequency, branch, model, x)
+    try:
+        result = fit_model(x, y, model)
+    except Exception as error:
+        return _result_row(frequency, branch, model, x, error=f"{type(error).__name__}: {error}")
+    return _result_row(frequency, branch, model, x, result)
+
+def _fit_chain(chain):
+    """
+    Fit one model to one branch across frequencies in order, each fit starting from the previous solution.
+    Return (rows, continuation report).
+    """
+    from scipy.optimize import OptimizeResult
+    fit_name, branch, items, prior = chain
+    model = get_model(fit_name)
+    data = {frequency: (x, y) for frequency, x, y in items}
+    errors = {}
+
+    def fit(frequency, guess):
+        try:
+            return fit_model(*data[frequency], model, initial_guess=guess)
+        except Exception as error:
+            errors[frequency] = f"{type(error).__name__}: {error}"
+            return OptimizeResult(x=np.asarray(guess, dtype=float), cost=np.inf, success=False, nfev=0, njev=0)
+
+    fittable = [frequency for frequency, (x, _) in data.items() if len(x) >= len(model.parameter_names)]
+    results, report = fit_in_sequence(fittable, fit, lambda frequency: model.initial_guess(*data[frequency]),
+                                      num_points=lambda frequency: len(data[frequency][0]), prior=prior)
+    rows = []
+    for frequency, (x, _) in data.items():
+        result = results.get(frequency)
+        if result is not None and frequency in errors and not np.isfinite(result.cost):
+            rows.append(_result_row(frequency, branch, model, x, error=errors[frequency]))
+        else:
+            rows.append(_result_row(frequency, branch, model, x, result))
+    return rows, report
+
+def prior_solutions(table):
+    """
+    Return {(model, branch): {frequency: params}} from a fit_model_sweep table, e.g. one saved from an earlier
+    run of the same device, for seeding fit_model_sweep(..., prior=...).
+    """
+    prior = {}
+    for row in table.itertuples(index=False):
+        model = get_model(row.model)
+        params = [getattr(row, name, np.nan) for name in model.parameter_names]
+        if row.success and np.all(np.isfinite(params)):
+            prior.setdefault((model.name, row.branch), {})[row.frequency] = np.array(params, dtype=float)
+    return prior
+
+def _sweep_branches(frequencies, voltage_data, theta_data, split, tolerance):
+    """
+    Yield (frequency, branch, voltage, theta) for every branch of every frequency.
+    """
+    if split != 'segments':
+        for frequency in frequencies:
+            for branch, voltage, theta in split_sweep(np.asarray(voltage_data[frequency]), np.asarray(theta_data[frequency]), split=split):
+                yield frequency, branch, voltage, theta
+        return
+    # Segment the frequencies in one call, then number the branches of each frequency in sweep order
+    branches = segment_sweeps(frequencies, voltage_data, tolerance=tolerance)
+    first_branch = np.searchsorted(branches.group, branches.group)
+    for i, (group, start, stop) in enumerate(zip(branches.group, branches.start, branches.stop)):
+        frequency = frequencies[group]
+        yield frequency, int(i - first_branch[i]), np.asarray(voltage_data[frequency])[start:stop], np.asarray(theta_data[frequency])[start:stop]
+
+def fit_model_sweep(frequencies, voltage_data, theta_data, models, voltage_cutoff=None, split='segments', tolerance=None, workers=None,
+                    warm_start=False, prior=None):
+    """
+    Fit every registered model in `models` to every selected frequency and sweep branch of the grouped
+    theta-vs-voltage data, dropping blank points and optionally points with |V| <= voltage_cutoff.
+    By default the branches are all up and down ramps of every voltage cycle, found with a turning-point
+    tolerance scaled to each frequency's voltage noise unless `tolerance` is given (see segment_sweeps);
+    split='halves' keeps the old single-cycle split and split=None fits each frequency whole.
+    With `warm_start`, each model and branch is fit across frequencies in order, starting from the previous
+    frequency's solution; `prior` (see prior_solutions) seeds fits from an earlier run and implies warm starts.
+    The summed continuation report is stored in the table's attrs['continuation'].
+    Return a pandas DataFrame with one row per (frequency, branch, model).
+    """
+    import pandas as pd
+    model_names = [get_model(model).name for model in models]
+    tasks = []
+    for frequency, branch, voltage, theta in _sweep_branches(frequencies, voltage_data, theta_data, split, tolerance):
+        keep = np.isfinite(voltage) & np.isfinite(theta)
+        if voltage_cutoff is not None:
+            keep &= np.abs(voltage) > voltage_cutoff
+        voltage, theta = voltage[keep], theta[keep]
+        tasks.extend((frequency, branch, fit_name, voltage, theta) for fit_name in model_names)
+
+    function = _fit_task
+    if warm_start or prior:
+        # One task per (model, branch) chain, so continuation stays inside a worker
+        chains = {}
+        for frequency, branch, fit_name, voltage, theta in tasks:
+            chains.setdefault((fit_name, branch), []).append((frequency, voltage, theta))
+        tasks = [(fit_name, branch, items, (prior or {}).get((fit_name, branch))) for (fit_name, branch), items in chains.items()]
+        function = _fit_chain
+
+    if workers == 1 or len(tasks) <= 1:
+        outputs = [function(task) for task in tasks]
+    else:
+        num_workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=num_workers) as executor:
+            outputs = list(executor.map(function, tasks, chunksize=max(1, len(tasks) // (4 * num_workers))))
+
+    if function is _fit_task:
+        return pd.DataFrame(outputs)
+    rows = [row for chain_rows, _ in outputs for row in chain_rows]
+    table = pd.DataFrame(rows).sort_values(['frequency', 'branch', 'model'], kind='stable').reset_index(drop=True)
+    reports = [report for _, report in outputs]
+    table.attrs['continuation'] = {key: sum(report[key] for report in reports) for key in reports[0]} if reports else {}
+    return table
+
+def select_best_models(table, criterion='bic'):
+    """
+    Return the row of `table` with the lowest `criterion` for every (frequency, branch).
+    The result is empty if no fit succeeded.
+    """
+    if criterion not in table.columns:
+        # Only successful fits have criteria
+        return table.iloc[:0].reset_index(drop=True)
+    fitted = table[table['success'] & table[criterion].notna()]
+    return fitted.loc[fitted.groupby(['frequency', 'branch'])[criterion].idxmin()].reset_index(drop=True)
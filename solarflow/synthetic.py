@@ -0,0 +1,73 @@
+import io
+import numpy as np
+
+from solarflow.fit import inverse_quadratic
+
+SWEEP_HEADERS = ['Time (s)', 'Frequency (Hz)', 'Voltage (V)', "Z' (Ohm)", "Z'' (Ohm)"]
+
+def triangle_sweep(num_steps, num_cycles=1, max_voltage=1.0):
+    """
+    Return voltages ramping -max -> +max -> -max `num_cycles` times over `num_steps` steps.
+    """
+    phase = np.linspace(0, num_cycles, num_steps, endpoint=False)
+    return max_voltage * (1 - 4 * np.abs(phase - np.floor(phase) - 0.5))
+
+def synthetic_sweep(num_rows=10000, num_frequencies=16, num_cycles=1, noise=0.01, hysteresis=0.15, blank_fraction=0.0,
+                    min_frequency=1e5, max_frequency=1e6, max_voltage=1.0, seed=0):
+    """
+    Generate a deterministic impedance sweep in the instrument's column layout.
+    Every voltage step measures all frequencies; at each frequency Z traces a noisy arc of a circle whose
+    radius follows an inverse quadratic in frequency, and theta follows a hysteretic arctan of the voltage.
+    Return {header: values}.
+    """
+    rng = np.random.default_rng(seed)
+    frequencies = np.geomspace(min_frequency, max_frequency, num_frequencies)
+    num_steps = max(num_rows // num_frequencies, 1)
+    voltage_steps = triangle_sweep(num_steps, num_cycles=num_cycles, max_voltage=max_voltage)
+    direction = np.sign(np.gradient(voltage_steps))
+    direction[direction == 0] = 1
+
+    radius = inverse_quadratic(frequencies, 2e3, 4e4 * (0.5 * min_frequency) ** 2, 0.5 * min_frequency)
+    # Centres lie on a line through the origin, further out for lower frequencies
+    apex_angle = np.deg2rad(-35)
+    distance = 1.5 * radius + 2e4
+    center_x, center_y = distance * np.cos(apex_angle), distance * np.sin(apex_angle)
+
+    theta_steps = 1.2 + 0.9 * np.arctan(3 * (voltage_steps - hysteresis * direction * max_voltage))
+    theta = theta_steps[:, None] + 0.05 * np.log(frequencies / min_frequency)[None, :]
+    real = center_x + radius * np.cos(theta)
+    imaginary = center_y + radius * np.sin(theta)
+    real += rng.normal(0, noise, real.shape) * radius
+    imaginary += rng.normal(0, noise, imaginary.shape) * radius
+
+    num_rows = num_steps * num_frequencies
+    data = {
+        'Time (s)': np.arange(num_rows) * 0.01,
+        'Frequency (Hz)': np.tile(frequencies, num_steps),
+        'Voltage (V)': np.repeat(voltage_steps, num_frequencies),
+        "Z' (Ohm)": real.ravel(),
+        "Z'' (Ohm)": imaginary.ravel(),
+    }
+    if blank_fraction > 0:
+        for header in ("Z' (Ohm)", "Z'' (Ohm)"):
+            data[header][rng.random(num_rows) < blank_fraction] = np.nan
+    return data
+
+def write_sweep_csv(file_name, data, delimiter=', ', preamble=None):
+    """
+    Write sweep columns as the instrument does: three preamble lines, a header row, then one row per sample.
+    Read back with read_csv_file(file_name, delimiter=delimiter, start_line=len(preamble)).
+    """
+    if preamble is None:
+        preamble = ['Synthetic impedance sweep', 'Instrument: solarflow.synthetic', '']
+    headers = list(data.keys())
+    table = np.column_stack([np.asarray(data[header], dtype=float) for header in headers])
+    body = io.StringIO()
+    np.savetxt(body, table, fmt='%.9g', delimiter=delimiter)
+    with open(file_name, 'w') as f:
+        for line in preamble:
+            f.write(line + '\n')
+        f.write(delimiter.join(headers) + '\n')
+        # Blank cells are written as empty fields, like the instrument does
+        f.write(body.getvalue().replace('nan', ''))
+    return file_name
@@ -0,0 +1,148 @@
+from collections import namedtuple
+import numpy as np
+
+from solarflow.analysis import circle_scatter, solve_circle_scatter, residuals, residuals_jacobian
+from solarflow.fit import fit_model, get_model
+
+Uncertainty = namedtuple('Uncertainty', ['estimate', 'std', 'lower', 'upper'])
+
+def bootstrap_indices(num_points, num_resamples, rng):
+    """
+    Return a (num_resamples, num_points) array of row indices drawn with replacement.
+    """
+    return rng.integers(0, num_points, size=(num_resamples, num_points))
+
+def _resample_counts(indices, num_points):
+    """
+    Convert bootstrap index arrays to how often each point is drawn in each resample.
+    """
+    num_resamples = len(indices)
+    flat = (indices + num_points * np.arange(num_resamples)[:, None]).ravel()
+    return np.bincount(flat, minlength=num_resamples * num_points).reshape(num_resamples, num_points)
+
+def _summarise(estimate, samples, confidence):
+    tail = 100 * (1 - confidence) / 2
+    lower, upper = np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+    return Uncertainty(np.asarray(estimate), np.nanstd(samples, axis=0, ddof=1), lower, upper)
+
+def bootstrap_circle_fits(frequencies, impedance_data_real, impedance_data_im, num_resamples=1000, method='taubin', confidence=0.95, seed=0):
+    """
+    Bootstrap the algebraic circle fit of every frequency.
+    All resamples of all frequencies are solved in one batched pass over their scatter matrices.
+    Return {frequency: Uncertainty} of (xc, yc, r).
+    """
+    rng = np.random.default_rng(seed)
+    scatters, origins, estimates = [], [], []
+    for frequency in frequencies:
+        x = np.asarray(impedance_data_real[frequency], dtype=float)
+        y = np.asarray(impedance_data_im[frequency], dtype=float)
+        valid = np.isfinite(x) & np.isfinite(y)
+        x, y = x[valid], y[valid]
+        num_points = len(x)
+        origin = np.array([[np.mean(x), np.mean(y)]]) if num_points else np.zeros((1, 2))
+        # Scatter of each point on its own, so a resample's scatter is its count-weighted sum
+        point_scatter = circle_scatter(x, y, np.arange(num_points), num_points, np.repeat(origin, num_points, axis=0)).reshape(num_points, 16)
+        counts = _resample_counts(bootstrap_indices(num_points, num_resamples, rng), num_points)
+        scatters.append((counts @ point_scatter).reshape(num_resamples, 4, 4))
+        origins.append(np.repeat(origin, num_resamples, axis=0))
+        estimates.append(np.column_stack(solve_circle_scatter(point_scatter.sum(axis=0).reshape(1, 4, 4), origin, method=method))[0])
+
+    if not estimates:
+        return {}
+    samples = np.column_stack(solve_circle_scatter(np.concatenate(scatters), np.concatenate(origins), method=method))
+    samples = samples.reshape(len(frequencies), num_resamples, 3)
+    return {frequency: _summarise(estimates[i], samples[i], confidence) for i, frequency in enumerate(frequencies)}
+
+def bootstrap_model_fit(x, y, fit_name, num_resamples=1000, confidence=0.95, seed=0, max_iterations=50, tolerance=1e-10):
+    """
+    Bootstrap a registered model fit. Every resample is refined from the full-data solution with
+    vectorised Levenberg-Marquardt steps on the model's analytic Jacobian.
+    Return an Uncertainty of the model parameters.
+    """
+    model = get_model(fit_name)
+    if model.jacobian is None:
+        raise ValueError(f"{model.name} has no analytic Jacobian to bootstrap with")
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    valid = np.isfinite(x) & np.isfinite(y)
+    x, y = x[valid], y[valid]
+    estimate = fit_model(x, y, model).x
+
+    rng = np.random.default_rng(seed)
+    indices = bootstrap_indices(len(x), num_resamples, rng)
+    x_resampled, y_resampled = x[indices], y[indices]
+    lower_bound, upper_bound = (np.broadcast_to(np.asarray(bound, dtype=float), estimate.shape) for bound in model.bounds)
+
+    def evaluate(params):
+        columns = [params[:, k:k + 1] for k in range(params.shape[1])]
+        return y_resampled - model.function(x_resampled, *columns), columns
+
+    params = np.tile(estimate, (num_resamples, 1))
+    residual, columns = evaluate(params)
+    cost = np.sum(residual ** 2, axis=1)
+    damping = np.full(num_resamples, 1e-3)
+    converged = np.zeros(num_resamples, dtype=bool)
+    num_params = len(estimate)
+    with np.errstate(all='ignore'):
+        for _ in range(max_iterations):
+            if converged.all():
+                break
+            jacobian = model.jacobian(x_resampled, *columns)
+            normal = np.einsum('bni,bnj->bij', jacobian, jacobian)
+            gradient = np.einsum('bni,bn->bi', jacobian, residual)
+            diagonal = np.einsum('bii->bi', normal)
+            damped = normal + damping[:, None, None] * diagonal[:, :, None] * np.eye(num_params)
+            damped[converged | ~np.all(np.isfinite(damped), axis=(1, 2))] = np.eye(num_params)
+            step = np.linalg.solve(damped, gradient[:, :, None])[..., 0]
+            trial = np.clip(params + step, lower_bound, upper_bound)
+            trial_residual, _ = evaluate(trial)
+            trial_cost = np.sum(trial_residual ** 2, axis=1)
+            improved = ~converged & (trial_cost < cost)
+            small_change = improved & (cost - trial_cost <= tolerance * cost)
+            params[improved] = trial[improved]
+            residual[improved] = trial_residual[improved]
+            cost[improved] = trial_cost[improved]
+            columns = [params[:, k:k + 1] for k in range(num_params)]
+            damping = np.where(improved, damping / 10, damping * 10)
+            converged |= small_change | (damping > 1e16)
+    return _summarise(estimate, params, confidence)
+
+def covariance_from_jacobian(jacobian, residual):
+    """
+    Return the parameter covariance s^2 (J^T J)^-1 of a least-squares fit, with s^2 = rss / (n - p).
+    The columns of J are scaled to unit norm before inverting, so parameters of very different magnitude,
+    such as the numerator and pole of an inverse quadratic, keep their variances.
+    """
+    jacobian = np.asarray(jacobian, dtype=float)
+    num_points, num_params = jacobian.shape
+    dof = max(num_points - num_params, 1)
+    scale = np.linalg.norm(jacobian, axis=0)
+    scale = np.where(scale > 0, scale, 1.0)
+    scaled = jacobian / scale
+    try:
+        inverse = np.linalg.inv(scaled.T @ scaled)
+    except np.linalg.LinAlgError:
+        # Parameters the data cannot tell apart get the pseudo-inverse's minimum-norm covariance
+        inverse = np.linalg.pinv(scaled.T @ scaled)
+    return np.sum(residual ** 2) / dof * inverse / np.outer(scale, scale)
+
+def model_fit_covariance(result):
+    """
+    Return the covariance of the parameters of a least_squares result, such as one from fit.fit_model.
+    """
+    return covariance_from_jacobian(result.jac, result.fun)
+
+def circle_fit_covariance(circle_fit, points):
+    """
+    Return the covariance of (xc, yc, r) for a circle fit to an (n, 2) array of points.
+    """
+    return covariance_from_jacobian(residuals_jacobian(circle_fit, points), residuals(circle_fit, points))
+
+def covariance_intervals(params, covariance, num_points, confidence=0.95):
+    """
+    Return an Uncertainty with Student-t confidence intervals from a parameter covariance.
+    """
+    from scipy.stats import t
+    params = np.asarray(params, dtype=float)
+    std = np.sqrt(np.diag(covariance))
+    half_width = t.ppf((1 + confidence) / 2, max(num_points - len(params), 1)) * std
+    return Uncertainty(params, std, params - half_width, params + half_width)
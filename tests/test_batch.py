@@ -0,0 +1,36 @@
+import json
+import numpy as np
+import pytest
+
+from solarflow.batch import load_manifest, run_batch, select_frequencies, unmatched_frequencies
+from solarflow.synthetic import synthetic_sweep, write_sweep_csv
+
+def _manifest(directory, devices):
+    write_sweep_csv(directory / 'sweep.csv', synthetic_sweep(num_rows=400, num_frequencies=4, seed=1))
+    manifest_path = directory / 'manifest.json'
+    manifest_path.write_text(json.dumps({'defaults': {'delimiter': ', '}, 'devices': devices}))
+    return manifest_path
+
+def test_duplicate_device_keys_are_rejected(tmp_path):
+    manifest_path = _manifest(tmp_path, [{'key': 'A', 'file': 'sweep.csv'}, {'key': 'A', 'file': 'sweep.csv'}])
+    with pytest.raises(ValueError, match='repeated: A'):
+        load_manifest(manifest_path)
+
+def test_unmatched_frequencies_are_reported(tmp_path):
+    manifest_path = _manifest(tmp_path, [{'key': 'A', 'file': 'sweep.csv'}, {'key': 'B', 'file': 'sweep.csv'}])
+    devices = load_manifest(manifest_path)
+    rows, summaries = run_batch(devices, workers=1, verbose=False)
+    frequencies = sorted({row['frequency'] for row in rows})
+    devices[1]['frequencies'] = [frequencies[0], 12.5]
+    rows, summaries = run_batch(devices, workers=1, verbose=False)
+    assert [summary['status'] for summary in summaries] == ['ok', 'ok']
+    assert 'unmatched_frequencies' not in summaries[0]
+    assert summaries[1]['n_frequencies'] == 1
+    assert summaries[1]['unmatched_frequencies'] == [12.5]
+
+def test_frequency_selection():
+    frequencies = np.array([1e3, 2e3, 3e3, 4e3])
+    np.testing.assert_array_equal(select_frequencies(frequencies, '1:3'), [2e3, 3e3])
+    np.testing.assert_array_equal(select_frequencies(frequencies, [2e3, 5e3]), [2e3])
+    assert unmatched_frequencies(frequencies, [2e3, 5e3]) == [5e3]
+    assert unmatched_frequencies(frequencies, '1:3') is None
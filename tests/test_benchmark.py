@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from solarflow.benchmark import compare_results, load_results, run_benchmarks, save_results, scaling_exponent
+
+def _report(seconds):
+    return {'measurements': [{'stage': stage, 'rows': rows, 'seconds': value} for (stage, rows), value in seconds.items()]}
+
+def test_scaling_exponent():
+    rows = np.array([1e4, 1e5, 1e6])
+    assert scaling_exponent(rows, 2e-6 * rows) == pytest.approx(1.0)
+    assert scaling_exponent(rows, 1e-9 * rows ** 2) == pytest.approx(2.0)
+    assert scaling_exponent([1e4], [0.1]) is None
+    assert scaling_exponent(rows, [0.1, 0.0, 0.3]) is None
+
+def test_compare_results_flags_slowdowns_only():
+    baseline = _report({('read', 100): 1.0, ('fit', 100): 2.0, ('fit', 1000): 0.0})
+    current = _report({('read', 100): 1.2, ('fit', 100): 3.0, ('fit', 1000): 5.0, ('new', 100): 9.0})
+    assert compare_results(baseline, current) == [('fit', 100, 2.0, 3.0, 1.5)]
+    assert compare_results(baseline, current, tolerance=1.1) == [('read', 100, 1.0, 1.2, 1.2), ('fit', 100, 2.0, 3.0, 1.5)]
+    assert compare_results(baseline, baseline) == []
+
+def test_run_benchmarks_report_round_trips(tmp_path):
+    results = run_benchmarks(sizes=(400, 800), num_frequencies=4, repeat=1, memory=False, stages=['read_csv_file'], verbose=False)
+    assert [(m['stage'], m['rows']) for m in results['measurements']] == [('read_csv_file', 400), ('read_csv_file', 800)]
+    assert set(results['scaling']) == {'read_csv_file'}
+    save_results(results, tmp_path / 'report.json')
+    assert load_results(tmp_path / 'report.json') == results
@@ -0,0 +1,34 @@
+import os
+import numpy as np
+
+from solarflow.cache import ParseCache
+from solarflow.inout import read_csv_columns
+from solarflow.synthetic import synthetic_sweep, write_sweep_csv
+
+def _write_sweeps(directory, count):
+    file_names = []
+    for i in range(count):
+        file_name = os.path.join(directory, f"sweep_{i}.csv")
+        write_sweep_csv(file_name, synthetic_sweep(num_rows=200, num_frequencies=4, blank_fraction=0.05, seed=i))
+        file_names.append(file_name)
+    return file_names
+
+def test_cached_read_matches_parse(tmp_path):
+    file_name, = _write_sweeps(tmp_path, 1)
+    cache = ParseCache(directory=tmp_path / 'cache')
+    expected_headers, expected = read_csv_columns(file_name, delimiter=', ', start_line=3)
+    for _ in range(2):
+        headers, data = cache.read(file_name, delimiter=', ', start_line=3)
+        assert headers == expected_headers
+        for header in headers:
+            np.testing.assert_array_equal(data[header], expected[header])
+    assert len(cache.entries()) == 1
+
+def test_entry_larger_than_max_bytes_is_returned(tmp_path):
+    file_names = _write_sweeps(tmp_path, 2)
+    cache = ParseCache(directory=tmp_path / 'cache', max_bytes=1000)
+    for file_name in file_names:
+        headers, data = cache.read(file_name, delimiter=', ', start_line=3)
+        assert len(data[headers[0]]) == 200
+    # Only the entry just returned survives eviction
+    assert [source for _, source, _, _ in cache.entries()] == [os.path.abspath(file_names[-1])]
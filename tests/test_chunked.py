@@ -0,0 +1,55 @@
+import os
+import numpy as np
+import pytest
+
+from solarflow.analysis import extract_theta_by_frequency, fit_circles_batched
+from solarflow.chunked import reduce_sweep_file
+from solarflow.data import FrequencyIndex
+from solarflow.inout import read_csv_file
+from solarflow.synthetic import synthetic_sweep, write_sweep_csv
+
+HEADERS = ('Frequency (Hz)', "Z' (Ohm)", "Z'' (Ohm)", 'Voltage (V)')
+
+@pytest.fixture
+def sweep_file(tmp_path):
+    file_name = tmp_path / 'sweep.csv'
+    write_sweep_csv(file_name, synthetic_sweep(num_rows=3000, num_frequencies=5, num_cycles=2, blank_fraction=0.02, seed=3))
+    return file_name
+
+def _in_memory(file_name):
+    _, data = read_csv_file(file_name, verbose=False, delimiter=', ', start_line=3)
+    index = FrequencyIndex(data, HEADERS[0])
+    frequencies = index.frequencies[index.frequencies != 0]
+    real, imaginary, voltage = (index.by_frequency(header, frequencies) for header in HEADERS[1:])
+    circle_fits, _ = fit_circles_batched(frequencies, real, imaginary, method='kasa')
+    theta = extract_theta_by_frequency(frequencies, real, imaginary, circle_fits)
+    return frequencies, voltage, circle_fits, theta
+
+@pytest.mark.parametrize('spill', [False, True])
+def test_chunked_reduction_matches_in_memory(sweep_file, tmp_path, spill):
+    frequencies, voltage, circle_fits, theta = _in_memory(sweep_file)
+    reduction = reduce_sweep_file(sweep_file, delimiter=', ', start_line=3, chunk_rows=700, method='kasa', bins=16,
+                                  spill_dir=tmp_path / 'spill' if spill else None)
+    np.testing.assert_array_equal(reduction.frequencies, frequencies)
+    for frequency in frequencies:
+        assert reduction.counts[frequency] == len(voltage[frequency])
+        np.testing.assert_allclose(reduction.circle_fits[frequency], circle_fits[frequency], rtol=1e-8)
+        edges = reduction.voltage_edges[frequency]
+        finite = voltage[frequency][np.isfinite(voltage[frequency])]
+        np.testing.assert_array_equal(reduction.voltage_histograms[frequency], np.histogram(finite, edges)[0])
+        finite = theta[frequency][np.isfinite(theta[frequency])]
+        assert reduction.theta_histograms[frequency].sum() == len(finite)
+        if spill:
+            np.testing.assert_array_equal(reduction.partitions['Voltage (V)'][frequency], voltage[frequency])
+
+def test_reused_spill_dir_starts_fresh(sweep_file, tmp_path):
+    spill_dir = tmp_path / 'spill'
+    reduce_sweep_file(sweep_file, delimiter=', ', start_line=3, chunk_rows=700, spill_dir=spill_dir)
+    other_file = tmp_path / 'other.csv'
+    write_sweep_csv(other_file, synthetic_sweep(num_rows=2000, num_frequencies=5, num_cycles=1, seed=4))
+    frequencies, voltage, _, _ = _in_memory(other_file)
+    reduction = reduce_sweep_file(other_file, delimiter=', ', start_line=3, chunk_rows=700, spill_dir=spill_dir)
+    for frequency in frequencies:
+        partition = reduction.partitions['Voltage (V)'][frequency]
+        assert os.path.getsize(partition.filename) == partition.nbytes
+        np.testing.assert_array_equal(partition, voltage[frequency])
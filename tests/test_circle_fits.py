@@ -0,0 +1,74 @@
+import warnings
+import numpy as np
+import pytest
+
+from solarflow.analysis import fit_circles_batched, fit_circles_by_frequency
+from solarflow.stream import CircleAccumulator
+
+def _arcs(num_frequencies=6, num_points=200, noise=0.01, seed=0):
+    rng = np.random.default_rng(seed)
+    frequencies = [float(10 ** (i + 1)) for i in range(num_frequencies)]
+    real, imaginary, circles = {}, {}, {}
+    for i, frequency in enumerate(frequencies):
+        xc, yc, r = 100.0 + 10 * i, -20.0 - i, 50.0 / (i + 1)
+        angle = np.linspace(0.2, 2.5, num_points)
+        real[frequency] = xc + r * np.cos(angle) + rng.normal(0, noise, num_points)
+        imaginary[frequency] = yc + r * np.sin(angle) + rng.normal(0, noise, num_points)
+        circles[frequency] = (xc, yc, r)
+    return frequencies, real, imaginary, circles
+
+@pytest.mark.parametrize('method', ['kasa', 'pratt', 'taubin'])
+def test_batched_matches_per_frequency(method):
+    frequencies, real, imaginary, circles = _arcs()
+    expected = fit_circles_by_frequency(frequencies, real, imaginary)
+    fits, diagnostics = fit_circles_batched(frequencies, real, imaginary, method=method, refine=True)
+    for frequency in frequencies:
+        np.testing.assert_allclose(fits[frequency], expected[frequency], rtol=1e-6, atol=1e-6)
+        np.testing.assert_allclose(fits[frequency], circles[frequency], rtol=1e-2)
+        assert diagnostics[frequency]['converged']
+
+def test_blank_cells_are_skipped():
+    frequencies, real, imaginary, _ = _arcs()
+    expected, _ = fit_circles_batched(frequencies, {frequency: real[frequency][1:-1] for frequency in frequencies},
+                                      {frequency: imaginary[frequency][1:-1] for frequency in frequencies})
+    for frequency in frequencies:
+        real[frequency][0] = np.nan
+        imaginary[frequency][-1] = np.nan
+    fits, diagnostics = fit_circles_batched(frequencies, real, imaginary)
+    for frequency in frequencies:
+        assert diagnostics[frequency]['n_points'] == len(real[frequency]) - 2
+        np.testing.assert_allclose(fits[frequency], expected[frequency], rtol=1e-10)
+
+@pytest.mark.parametrize('method', ['kasa', 'pratt', 'taubin'])
+@pytest.mark.parametrize('refine', [False, True])
+def test_degenerate_groups_are_nan_without_warnings(method, refine):
+    frequencies, real, imaginary, _ = _arcs(num_frequencies=1)
+    line = np.linspace(1e3, 1e3 + 1, 30)
+    degenerate = {'collinear': (line, 2 * line + 5), 'two points': (np.array([1., 2.]), np.array([1., 3.])),
+                  'one point repeated': (np.ones(5), np.ones(5)), 'blank': (np.full(4, np.nan), np.full(4, np.nan)),
+                  'empty': (np.array([]), np.array([]))}
+    for i, (x, y) in enumerate(degenerate.values()):
+        frequencies.append(float(i + 100))
+        real[frequencies[-1]], imaginary[frequencies[-1]] = x, y
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        fits, diagnostics = fit_circles_batched(frequencies, real, imaginary, method=method, refine=refine)
+    assert np.all(np.isfinite(fits[frequencies[0]]))
+    assert diagnostics[frequencies[0]]['converged']
+    for frequency in frequencies[1:]:
+        assert np.all(np.isnan(fits[frequency]))
+        assert not diagnostics[frequency]['converged']
+
+def test_stream_accumulator_matches_batched():
+    frequencies, real, imaginary, _ = _arcs()
+    expected, _ = fit_circles_batched(frequencies, real, imaginary, method='kasa')
+    accumulator = CircleAccumulator(method='kasa')
+    for half in (slice(None, 100), slice(100, None)):
+        accumulator.update(np.repeat(frequencies, 100), np.concatenate([real[frequency][half] for frequency in frequencies]),
+                           np.concatenate([imaginary[frequency][half] for frequency in frequencies]))
+    line = np.linspace(0, 1, 10)
+    accumulator.update(np.full(10, 0.5), line, line)
+    fits = accumulator.fits()
+    for frequency in frequencies:
+        np.testing.assert_allclose(fits[frequency], expected[frequency], rtol=1e-8)
+    assert np.all(np.isnan(fits[0.5]))
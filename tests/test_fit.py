@@ -0,0 +1,25 @@
+import numpy as np
+
+from solarflow.analysis import fit_circles_in_sequence
+from solarflow.fit import arc_tan, fit_model
+
+def test_fit_model_skips_blank_points():
+    x = np.linspace(-1, 1, 200)
+    y = arc_tan(x, 2.0, 3.0, 0.5, -1.0)
+    expected = fit_model(x, y, 'Arctan')
+    x[5], y[17] = np.nan, np.nan
+    result = fit_model(x, y, 'Arctan')
+    assert result.success
+    assert len(result.fun) == len(x) - 2
+    np.testing.assert_allclose(result.x, expected.x, rtol=1e-6)
+
+def test_circle_sequence_skips_blank_points():
+    angle = np.linspace(0, 2, 50)
+    frequencies = [1.0, 2.0]
+    real = {frequency: 3 + frequency * np.cos(angle) for frequency in frequencies}
+    imaginary = {frequency: -1 + frequency * np.sin(angle) for frequency in frequencies}
+    real[1.0][0] = imaginary[2.0][10] = np.nan
+    fits, report = fit_circles_in_sequence(frequencies, real, imaginary)
+    for frequency in frequencies:
+        np.testing.assert_allclose(fits[frequency], (3, -1, frequency), rtol=1e-6, atol=1e-6)
+    assert report['fits'] == 2
@@ -0,0 +1,61 @@
+from collections import defaultdict
+import numpy as np
+import pytest
+
+from solarflow.inout import read_csv_chunks, read_csv_file
+from solarflow.synthetic import synthetic_sweep, write_sweep_csv
+
+def _read_csv_lines(file_name, delimiter=',', start_line=0):
+    """
+    The original line-by-line reader, kept as the reference the pandas reader must agree with.
+    Only the line break is stripped from data rows, so a blank last cell survives a ', ' delimiter.
+    """
+    headers = []
+    data = defaultdict(list)
+    with open(file_name, 'r') as f:
+        for i, line in enumerate(f):
+            if i < start_line:
+                continue
+            elif i == start_line:
+                headers = [header.strip() for header in line.strip().split(delimiter)]
+            else:
+                for column, value in enumerate(line.rstrip('\n').split(delimiter)):
+                    data[headers[column]].append(value)
+    return headers, {key: np.array([float(value) if value != '' and value != ' ' else np.nan for value in values])
+                     for key, values in data.items()}
+
+@pytest.mark.parametrize('delimiter', [', ', ','])
+def test_reader_matches_line_reader(tmp_path, delimiter):
+    file_name = tmp_path / 'sweep.csv'
+    write_sweep_csv(file_name, synthetic_sweep(num_rows=500, num_frequencies=4, blank_fraction=0.05, seed=2), delimiter=delimiter)
+    expected_headers, expected = _read_csv_lines(file_name, delimiter=delimiter, start_line=3)
+    headers, data = read_csv_file(file_name, verbose=False, delimiter=delimiter, start_line=3)
+    assert headers == expected_headers
+    for header in headers:
+        np.testing.assert_array_equal(data[header], expected[header])
+    assert any(np.isnan(values).any() for values in data.values())
+
+    columns = [headers[2], headers[0]]
+    selected, data = read_csv_file(file_name, verbose=False, delimiter=delimiter, start_line=3, columns=columns)
+    assert selected == [headers[0], headers[2]]
+    for header in selected:
+        np.testing.assert_array_equal(data[header], expected[header])
+
+def test_missing_columns_raise(tmp_path):
+    file_name = tmp_path / 'sweep.csv'
+    write_sweep_csv(file_name, synthetic_sweep(num_rows=10, num_frequencies=2))
+    with pytest.raises(KeyError):
+        read_csv_file(file_name, verbose=False, delimiter=', ', start_line=3, columns=['Missing'])
+
+def test_chunks_match_line_reader(tmp_path):
+    file_name = tmp_path / 'sweep.csv'
+    write_sweep_csv(file_name, synthetic_sweep(num_rows=500, num_frequencies=4, blank_fraction=0.05, seed=2))
+    headers, expected = _read_csv_lines(file_name, delimiter=', ', start_line=3)
+    columns = [headers[2], headers[0]]
+    chunks = list(read_csv_chunks(file_name, columns=columns, delimiter=', ', start_line=3, chunk_rows=150))
+    assert [len(chunk[headers[0]]) for chunk in chunks] == [150, 150, 150, 50]
+    assert all(list(chunk) == [headers[0], headers[2]] for chunk in chunks)
+    for header in columns:
+        np.testing.assert_array_equal(np.concatenate([chunk[header] for chunk in chunks]), expected[header])
+    with pytest.raises(KeyError):
+        next(read_csv_chunks(file_name, columns=['Missing'], delimiter=', ', start_line=3))
@@ -0,0 +1,61 @@
+import json
+import sys
+import numpy as np
+import pytest
+
+from solarflow.pipeline import load_config, run_pipeline
+from solarflow.synthetic import synthetic_sweep, write_sweep_csv
+
+UPSTREAM = ['read', 'group']
+DOWNSTREAM = ['select', 'circles', 'theta', 'radius_fit', 'theta_fit', 'plots']
+
+@pytest.fixture
+def config(tmp_path):
+    write_sweep_csv(tmp_path / 'sweep.csv', synthetic_sweep(num_rows=800, num_frequencies=6, seed=0))
+    return {
+        'input': {'file': 'sweep.csv', 'delimiter': ', '},
+        'select': {'frequencies': '1:'},
+        'circles': {'method': 'taubin'},
+        'radius_fit': {'model': 'Inverse Quadratic'},
+        'theta_fit': {'models': ['Arctan'], 'split': 'halves'},
+    }
+
+def _write_json(tmp_path, config):
+    config_path = tmp_path / 'pipeline.json'
+    config_path.write_text(json.dumps(config))
+    return config_path
+
+def test_changing_select_recomputes_only_downstream_stages(tmp_path, config):
+    cache_dir = tmp_path / 'memo'
+    first = run_pipeline(_write_json(tmp_path, config), cache_dir=cache_dir, verbose=False)
+    assert first.executed == UPSTREAM + DOWNSTREAM
+    assert len(first.get('select')) == 5
+
+    second = run_pipeline(_write_json(tmp_path, config), cache_dir=cache_dir, verbose=False)
+    assert second.executed == []
+    assert second.reused == UPSTREAM + DOWNSTREAM
+    np.testing.assert_array_equal(second.get('select'), first.get('select'))
+
+    config['select']['frequencies'] = '2:'
+    third = run_pipeline(_write_json(tmp_path, config), cache_dir=cache_dir, verbose=False)
+    assert third.reused == UPSTREAM
+    assert third.executed == DOWNSTREAM
+    assert len(third.get('select')) == 4
+    assert sorted(third.get('theta_fit')['frequency'].unique()) == list(third.get('select'))
+
+def test_config_formats_load_alike(tmp_path, config):
+    pytest.importorskip('tomllib' if sys.version_info >= (3, 11) else 'tomli')
+    yaml = pytest.importorskip('yaml')
+    (tmp_path / 'pipeline.toml').write_text('\n'.join([
+        '[input]', 'file = "sweep.csv"', 'delimiter = ", "',
+        '[select]', 'frequencies = "1:"',
+        '[circles]', 'method = "taubin"',
+        '[radius_fit]', 'model = "Inverse Quadratic"',
+        '[theta_fit]', 'models = ["Arctan"]', 'split = "halves"']))
+    (tmp_path / 'pipeline.yaml').write_text(yaml.safe_dump(config))
+    expected = load_config(_write_json(tmp_path, config))
+    assert load_config(tmp_path / 'pipeline.toml') == expected
+    assert load_config(tmp_path / 'pipeline.yaml') == expected
+    assert expected['input']['file'] == str(tmp_path / 'sweep.csv')
+    with pytest.raises(ValueError):
+        load_config(tmp_path / 'sweep.csv')
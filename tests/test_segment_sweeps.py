@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from solarflow.analysis import segment_sweeps
+from solarflow.sweep import split_sweep
+
+def _cycles(num_cycles=2, step=0.001, amplitude=1.0):
+    """
+    Voltage running 0 -> amplitude -> -amplitude -> 0 `num_cycles` times; 2 * num_cycles + 1 monotonic ramps.
+    """
+    up = np.arange(0, amplitude, step)
+    cycle = np.concatenate([up, up[::-1][1:], -up[1:], -up[::-1][1:-1]])
+    return np.append(np.tile(cycle, num_cycles), 0.0)
+
+def test_clean_sweep_splits_at_turning_points():
+    voltage = _cycles()
+    branches = segment_sweeps([1.0], {1.0: voltage})
+    np.testing.assert_array_equal(branches.direction, [1, -1, 1, -1, 1])
+    np.testing.assert_array_equal(branches.start[1:], branches.stop[:-1])
+    assert branches.stop[-1] == len(voltage)
+    for start, stop, direction in zip(branches.start, branches.stop, branches.direction):
+        assert np.all(direction * np.diff(voltage[start:stop]) > 0)
+    # Turning points end the branch that reached them
+    assert voltage[branches.stop[0] - 1] == voltage.max()
+    assert voltage[branches.stop[1] - 1] == voltage.min()
+
+@pytest.mark.parametrize('tolerance', [None, 0.02])
+def test_noisy_sweep_keeps_one_branch_per_ramp(tolerance):
+    clean = _cycles()
+    voltage = clean + np.random.default_rng(0).normal(0, 0.002, len(clean))
+    branches = segment_sweeps([1.0], {1.0: voltage}, tolerance=tolerance)
+    np.testing.assert_array_equal(branches.direction, [1, -1, 1, -1, 1])
+    expected = segment_sweeps([1.0], {1.0: clean})
+    assert np.all(np.abs(branches.stop[:-1] - expected.stop[:-1]) < 20)
+
+def test_held_voltage_and_blank_cells():
+    voltage = np.array([0., 1., 2., 2., 2., 1., 0., np.nan, 1., 2.])
+    branches = segment_sweeps([1.0, 2.0, 3.0], {1.0: voltage, 2.0: np.full(3, np.nan), 3.0: np.ones(4)})
+    np.testing.assert_array_equal(branches.group, [0, 0, 0, 2])
+    np.testing.assert_array_equal(branches.start, [0, 5, 7, 0])
+    np.testing.assert_array_equal(branches.stop, [5, 7, 10, 4])
+    np.testing.assert_array_equal(branches.direction, [1, -1, 1, 0])
+
+def test_split_sweep_segments_and_halves():
+    voltage = _cycles(num_cycles=1, step=0.1)
+    theta = np.arange(len(voltage), dtype=float)
+    segments = split_sweep(voltage, theta)
+    assert [branch for branch, _, _ in segments] == [0, 1, 2]
+    assert np.shares_memory(segments[1][1], voltage)
+    np.testing.assert_array_equal(np.concatenate([t for _, _, t in segments]), theta)
+    halves = split_sweep(voltage, theta, split='halves')
+    assert [len(v) for _, v, _ in halves] == [len(voltage) // 2, len(voltage) - len(voltage) // 2]
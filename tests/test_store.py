@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from solarflow.store import ResultsStore, batch_records
+
+@pytest.fixture
+def store(tmp_path):
+    with ResultsStore(tmp_path / 'results.db') as store:
+        yield store
+
+def _add_run(store, date, radii, devices=('R_1', 'R_2'), model='taubin'):
+    run_id = store.start_run(description=date)
+    store.add_results(run_id, [(device, date, frequency, model, 'r', radius + i)
+                               for i, device in enumerate(devices) for frequency, radius in radii.items()])
+    return run_id
+
+def test_date_range_survives_newer_runs(store):
+    _add_run(store, '2024-08-15', {1e5: 10.0, 2e5: 5.0})
+    _add_run(store, '2024-09-15', {1e5: 20.0, 2e5: 15.0})
+    august = store.arrays('r', 'R_*', date_from='2024-08-01', date_to='2024-08-31')
+    assert sorted(august) == ['R_1', 'R_2']
+    np.testing.assert_array_equal(august['R_1'][0], [1e5, 2e5])
+    np.testing.assert_array_equal(august['R_1'][1], [10.0, 5.0])
+    np.testing.assert_array_equal(august['R_2'][1], [11.0, 6.0])
+    # Without a date range every measurement date is returned, from its latest run
+    assert store.query('r', device='R_1')['date'].tolist() == ['2024-08-15', '2024-08-15', '2024-09-15', '2024-09-15']
+
+def test_latest_run_per_date_and_filters(store):
+    _add_run(store, '2024-08-15', {1e5: 10.0})
+    _add_run(store, '2024-08-15', {1e5: 12.0})
+    _add_run(store, '2024-08-15', {1e5: 30.0}, model='kasa')
+    assert store.query('r', device='R_1')['value'].tolist() == [30.0]
+    assert store.query('r', device='R_1', model='taubin')['value'].tolist() == [12.0]
+    assert store.query('r', device='R_1', latest=False)['value'].tolist() == [10.0, 12.0, 30.0]
+    assert store.query('r', device='R_1', frequency=2e5).empty
+
+def test_batch_records(store):
+    rows = [{'device': 'R_1', 'frequency': 1e5, 'xc': 1.0, 'r': 2.0, 'theta_a': 0.5, 'converged': True}]
+    summaries = [{'device': 'R_1', 'status': 'ok', 'date': '2024-08-15', 'circle_method': 'taubin', 'theta_model': 'Arctan',
+                  'radius_a': 3.0, 'unmatched_frequencies': [1.0]}]
+    records = batch_records(rows, summaries)
+    assert ('R_1', '2024-08-15', 1e5, 'Arctan', 'theta_a', 0.5) in records
+    assert ('R_1', '2024-08-15', 1e5, 'taubin', 'converged', 1.0) in records
+    assert ('R_1', '2024-08-15', None, '', 'radius_a', 3.0) in records
+    assert not any(quantity == 'unmatched_frequencies' for *_, quantity, _ in records)
+    run_id = store.start_run()
+    assert store.add_results(run_id, records) == len(records)
+    assert store.query('radius_a')['frequency'].isna().all()
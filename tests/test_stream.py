@@ -0,0 +1,50 @@
+import numpy as np
+
+from solarflow.analysis import fit_circles_batched
+from solarflow.data import FrequencyIndex
+from solarflow.inout import read_csv_file
+from solarflow.stream import CsvTail, stream_circle_fits
+from solarflow.synthetic import synthetic_sweep, write_sweep_csv
+
+HEADERS = ['Frequency (Hz)', "Z' (Ohm)", "Z'' (Ohm)", 'Voltage (V)']
+
+def _batch_fits(file_name):
+    _, data = read_csv_file(file_name, verbose=False, delimiter=', ', start_line=3)
+    index = FrequencyIndex(data, HEADERS[0])
+    frequencies = index.frequencies[index.frequencies != 0]
+    fits, _ = fit_circles_batched(frequencies, index.by_frequency(HEADERS[1], frequencies),
+                                  index.by_frequency(HEADERS[2], frequencies), method='kasa')
+    return fits
+
+def test_tail_reads_appended_lines(tmp_path):
+    file_name = tmp_path / 'sweep.csv'
+    write_sweep_csv(file_name, synthetic_sweep(num_rows=100, num_frequencies=4, seed=0))
+    lines = file_name.read_text().splitlines(keepends=True)
+    file_name.write_text(''.join(lines[:50]) + lines[50][:5])
+    tail = CsvTail(file_name, delimiter=', ', start_line=3, columns=HEADERS)
+    assert len(tail.read_new()[HEADERS[0]]) == 46
+    assert tail.read_new() is None
+    with open(file_name, 'a') as f:
+        f.write(''.join(lines[50:])[5:])
+    assert len(tail.read_new()[HEADERS[0]]) == 54
+    assert tail.generation == 0
+
+def test_truncated_file_restarts_fits(tmp_path):
+    file_name = tmp_path / 'sweep.csv'
+    write_sweep_csv(file_name, synthetic_sweep(num_rows=2000, num_frequencies=4, seed=0))
+    updates = stream_circle_fits(file_name, delimiter=', ', start_line=3, poll_interval=0, idle_timeout=0)
+    first = next(updates)
+    assert not first.restarted
+    expected = _batch_fits(file_name)
+    for frequency, fit in first.circle_fits.items():
+        np.testing.assert_allclose(fit, expected[frequency], rtol=1e-8)
+
+    # The instrument starts a new, shorter sweep in the same file
+    write_sweep_csv(file_name, synthetic_sweep(num_rows=800, num_frequencies=4, noise=0.05, seed=1))
+    second = next(updates)
+    assert second.restarted
+    assert second.rows == 800
+    expected = _batch_fits(file_name)
+    for frequency, fit in second.circle_fits.items():
+        np.testing.assert_allclose(fit, expected[frequency], rtol=1e-8)
+    assert list(updates) == []
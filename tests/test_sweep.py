@@ -0,0 +1,20 @@
+import numpy as np
+import pandas as pd
+
+from solarflow.fit import arc_tan
+from solarflow.sweep import fit_model_sweep, select_best_models
+
+def test_select_best_models_picks_lowest_criterion():
+    voltage = np.linspace(-1, 1, 100)
+    theta = arc_tan(voltage, 2.0, 3.0, 0.5, -1.0) + np.random.default_rng(0).normal(0, 1e-3, 100)
+    table = fit_model_sweep([1.0, 2.0], {1.0: voltage, 2.0: voltage[:2]}, {1.0: theta, 2.0: theta[:2]},
+                            ['Arctan', 'Gaussian'], split=None, workers=1)
+    best = select_best_models(table)
+    assert best['frequency'].tolist() == [1.0]
+    assert best['model'].tolist() == ['Arctan']
+
+def test_select_best_models_without_successful_fits():
+    table = fit_model_sweep([1.0], {1.0: np.array([0., 1.])}, {1.0: np.array([0., 1.])}, ['Arctan'], split=None, workers=1)
+    assert not table['success'].any()
+    assert select_best_models(table).empty
+    assert select_best_models(pd.DataFrame()).empty
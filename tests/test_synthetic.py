@@ -0,0 +1,39 @@
+import numpy as np
+
+from solarflow.analysis import fit_circles_batched
+from solarflow.data import FrequencyIndex
+from solarflow.inout import read_csv_file
+from solarflow.synthetic import SWEEP_HEADERS, synthetic_sweep, triangle_sweep, write_sweep_csv
+
+def test_triangle_sweep():
+    voltage = triangle_sweep(8, num_cycles=2, max_voltage=2.0)
+    np.testing.assert_allclose(voltage, [-2, 0, 2, 0, -2, 0, 2, 0])
+
+def test_sweep_is_deterministic_and_laid_out_like_the_instrument():
+    data = synthetic_sweep(num_rows=1000, num_frequencies=8, blank_fraction=0.1, seed=5)
+    assert list(data) == SWEEP_HEADERS
+    assert all(len(values) == 1000 for values in data.values())
+    # Every voltage step measures all frequencies
+    np.testing.assert_array_equal(data['Frequency (Hz)'][:8], np.geomspace(1e5, 1e6, 8))
+    assert np.all(data['Voltage (V)'].reshape(125, 8) == data['Voltage (V)'][::8, None])
+    blank = np.isnan(data["Z' (Ohm)"])
+    assert 0.05 < blank.mean() < 0.15
+    assert not np.isnan(data['Voltage (V)']).any()
+    again = synthetic_sweep(num_rows=1000, num_frequencies=8, blank_fraction=0.1, seed=5)
+    for header in SWEEP_HEADERS:
+        np.testing.assert_array_equal(again[header], data[header])
+    assert not np.array_equal(synthetic_sweep(num_rows=1000, num_frequencies=8, seed=6)["Z' (Ohm)"], data["Z' (Ohm)"])
+
+def test_written_sweep_reads_back(tmp_path):
+    data = synthetic_sweep(num_rows=2000, num_frequencies=4, noise=0.001, blank_fraction=0.02)
+    file_name = write_sweep_csv(tmp_path / 'sweep.csv', data)
+    assert file_name.read_text().splitlines()[3] == ', '.join(SWEEP_HEADERS)
+    headers, read = read_csv_file(file_name, verbose=False, delimiter=', ', start_line=3)
+    assert headers == SWEEP_HEADERS
+    for header in headers:
+        np.testing.assert_allclose(read[header], data[header], rtol=1e-8)
+    # The impedance of every frequency lies on an arc whose radius falls as the frequency rises
+    index = FrequencyIndex(read)
+    fits, _ = fit_circles_batched(index.frequencies, index.by_frequency("Z' (Ohm)"), index.by_frequency("Z'' (Ohm)"))
+    radii = np.array([fits[frequency][2] for frequency in index.frequencies])
+    assert np.all(np.diff(radii) < 0)
@@ -0,0 +1,45 @@
+import numpy as np
+
+from solarflow.fit import fit_model, inverse_quadratic
+from solarflow.uncertainty import (bootstrap_circle_fits, bootstrap_model_fit, circle_fit_covariance, covariance_from_jacobian,
+                                   model_fit_covariance)
+
+# Omega* fit of radius against frequency: a pole at 450 kHz seen from 100-400 kHz
+TRUE_PARAMS = (2000.0, 1e14, 450e3)
+
+def _radii(num_points, noise, rng):
+    frequencies = np.linspace(100e3, 400e3, num_points)
+    radii = inverse_quadratic(frequencies, *TRUE_PARAMS)
+    return frequencies, radii + noise * radii.mean() * rng.normal(size=num_points)
+
+def test_inverse_quadratic_covariance_matches_bootstrap():
+    frequencies, radii = _radii(40, 0.02, np.random.default_rng(0))
+    std = np.sqrt(np.diag(model_fit_covariance(fit_model(frequencies, radii, 'Inverse Quadratic'))))
+    bootstrap = bootstrap_model_fit(frequencies, radii, 'Inverse Quadratic', num_resamples=1000)
+    assert np.all((bootstrap.std / std > 0.5) & (bootstrap.std / std < 2))
+
+def test_inverse_quadratic_covariance_matches_repeated_noise():
+    # Twelve points are too few for a reliable bootstrap, so compare with fits to fresh noise instead
+    rng = np.random.default_rng(1)
+    params, stds = [], []
+    for _ in range(100):
+        result = fit_model(*_radii(12, 0.02, rng), 'Inverse Quadratic')
+        params.append(result.x)
+        stds.append(np.sqrt(np.diag(model_fit_covariance(result))))
+    np.testing.assert_allclose(np.median(stds, axis=0), np.std(params, axis=0), rtol=0.25)
+
+def test_covariance_is_invariant_to_parameter_scale():
+    rng = np.random.default_rng(2)
+    jacobian, residual = rng.normal(size=(20, 3)), rng.normal(size=20)
+    scale = np.array([1e-10, 1.0, 1e8])
+    expected = covariance_from_jacobian(jacobian, residual)
+    np.testing.assert_allclose(covariance_from_jacobian(jacobian / scale, residual), expected * np.outer(scale, scale), rtol=1e-8)
+
+def test_circle_covariance_matches_bootstrap():
+    rng = np.random.default_rng(3)
+    angle = np.linspace(0.3, 2.8, 300)
+    x, y = 5 + 2 * np.cos(angle) + rng.normal(0, 0.02, 300), -1 + 2 * np.sin(angle) + rng.normal(0, 0.02, 300)
+    bootstrap = bootstrap_circle_fits([1.0], {1.0: x}, {1.0: y}, num_resamples=500)[1.0]
+    std = np.sqrt(np.diag(circle_fit_covariance(bootstrap.estimate, np.column_stack([x, y]))))
+    np.testing.assert_allclose(bootstrap.estimate, (5, -1, 2), atol=0.05)
+    assert np.all((bootstrap.std / std > 0.7) & (bootstrap.std / std < 1.5))